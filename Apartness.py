@@ -20,10 +20,17 @@ class Apartness:
     @staticmethod
     def states_are_apart(state1, state2, ob_tree):
         # Checks if two states are apart by checking any output difference in the observation tree
+        apart = ob_tree.apartness_cache.get(state1, state2)
+        if apart is not None:
+            return apart
         if ob_tree.automaton_type == 'mealy':
-            return Apartness._show_states_are_apart_mealy(state1, state2, ob_tree.alphabet) is not None
+            apart = Apartness._show_states_are_apart_mealy(state1, state2, ob_tree.alphabet) is not None
+        elif ob_tree.subtree_signatures is not None:
+            apart = ob_tree.subtree_signatures.apart(state1, state2)
         else:
-            return Apartness._show_states_are_apart_moore(state1, state2, ob_tree.alphabet) is not None
+            apart = Apartness._show_states_are_apart_moore(state1, state2, ob_tree.alphabet) is not None
+        ob_tree.apartness_cache.put(state1, state2, apart)
+        return apart
 
     @staticmethod
     def _show_states_are_apart_mealy(first, second, alphabet):
@@ -104,6 +111,10 @@ class Apartness:
         if not experiment:
             return conflicts != []
 
+        if ob_tree.lazy_experiments:
+            Apartness._run_experiments_lazily(first, second, conflicts, ob_tree)
+            return conflicts != []
+
         for first_access, second_access in conflicts:
             # Incompatible!
 
@@ -132,16 +143,81 @@ class Apartness:
 
         return conflicts != []
 
+    @staticmethod
+    def _run_experiments_lazily(first, second, conflicts, ob_tree):
+        """
+        Run the experiments of all conflicts once each, shortest first, and stop as soon as the two nodes are apart.
+        The candidates are the same as in states_are_incompatible.
+        """
+        transfer_sequence = ob_tree.get_transfer_sequence(first, second)
+        candidates = dict()
+        for first_access, second_access in conflicts:
+            suffix = transfer_sequence + first_access[len(first.access_sequence):]
+            candidate = first.access_sequence + suffix
+            while candidate != second_access:
+                candidates.setdefault(tuple(candidate), candidate)
+                suffix = transfer_sequence + suffix
+                candidate = first.access_sequence + suffix
+
+        # The sort is stable, so candidates of equal length keep the order of the conflicts
+        for candidate in sorted(candidates.values(), key=len):
+            _ = ob_tree.experiment(candidate)
+            if Apartness.states_are_apart(first, second, ob_tree):
+                return
+
     @staticmethod
     def merge(first, second, ob_tree):
         """
         Merge the second node into the first node.
+        Folding the loop maps the copies second t, second t t, ... of the transfer sequence t onto the first node,
+        a conflict is a sequence after which a copy and the first node have different known outputs. All copies are
+        compared in a single BFS over the subtree of the first node, instead of one BFS per copy.
         :param first: Node to merge into
         :param second: Node to merge from
         :param ob_tree: Observation tree
         :return: Whether there was a conflict during the merge
         """
-        # Obtain the transfer sequence from first to second
+        if ob_tree.automaton_type == "mealy":
+            return Apartness._merge_unrolled(first, second, ob_tree)
+        # Obtain the transfer sequence from first to second, and follow it once for every copy
+        transfer_sequence = ob_tree.get_transfer_sequence(first, second)
+        copies = []
+        copy = Apartness.get_successors(second, transfer_sequence)
+        while copy is not None:
+            copies.append(copy)
+            copy = Apartness.get_successors(copy, transfer_sequence)
+
+        # Conflicts per copy, each in the BFS order of get_distinguishing_sequences
+        witnesses = [[] for _ in copies]
+        queue = deque([([], first, [(i, copy) for i, copy in enumerate(copies) if copy.leads_to_known])])
+        if not first.leads_to_known:
+            queue.clear()
+        while queue:
+            access_seq, first_node, members = queue.popleft()
+            for i, node in members:
+                if Apartness.incompatible_output(first_node.output, node.output):
+                    witnesses[i].append(access_seq)
+            for input_val in ob_tree.alphabet:
+                first_successor = first_node.get_successor(input_val)
+                if first_successor is None or not first_successor.leads_to_known:
+                    continue
+                successors = []
+                for i, node in members:
+                    successor = node.get_successor(input_val)
+                    if successor is not None and successor.leads_to_known:
+                        successors.append((i, successor))
+                if successors:
+                    queue.append((access_seq + [input_val], first_successor, successors))
+
+        conflicts = []
+        for copy, copy_witnesses in zip(copies, witnesses):
+            for witness in copy_witnesses:
+                conflicts.append((first.access_sequence + witness, copy.access_sequence + witness))
+        return conflicts
+
+    @staticmethod
+    def _merge_unrolled(first, second, ob_tree):
+        # Merge by unrolling the transfer sequence, with one BFS for every copy
         transfer_sequence = ob_tree.get_transfer_sequence(first, second)
         sequence = transfer_sequence.copy()
         conflicts = []
@@ -162,6 +238,8 @@ class Apartness:
     def get_distinguishing_sequences(group, ob_tree):
         if ob_tree.automaton_type == "mealy":
             return Apartness._get_distinguishing_sequences_mealy(group, ob_tree.alphabet)
+        elif ob_tree.array_tree is not None:
+            return ob_tree.array_tree.distinguishing_sequences(list(group))
         else:
             return Apartness._get_distinguishing_sequences_moore(group, ob_tree.alphabet)
 
@@ -0,0 +1,35 @@
+class ApartnessCache:
+    """
+    Apartness of node pairs in one observation tree. Observations are only added to the tree, so nodes that are apart
+    stay apart and are stored for good. Pairs that are not apart are stored with the versions of both subtrees, and
+    are only checked again once one of the subtrees has new known outputs.
+    """
+
+    def __init__(self):
+        self.apart = set()
+        self.not_apart = dict()
+
+    @staticmethod
+    def _order(first, second):
+        return (first, second) if first.id < second.id else (second, first)
+
+    def get(self, first, second):
+        """
+        Returns whether the nodes are apart, or None if the pair has to be checked.
+        """
+        first, second = ApartnessCache._order(first, second)
+        key = (first.id, second.id)
+        if key in self.apart:
+            return True
+        if self.not_apart.get(key) == (first.version, second.version):
+            return False
+        return None
+
+    def put(self, first, second, apart):
+        first, second = ApartnessCache._order(first, second)
+        key = (first.id, second.id)
+        if apart:
+            self.apart.add(key)
+            self.not_apart.pop(key, None)
+        else:
+            self.not_apart[key] = (first.version, second.version)
@@ -0,0 +1,104 @@
+import numpy as np
+
+
+class ArrayTree:
+    """
+    Snapshot of the observation tree as arrays, for apartness checks of many node pairs at once. Every node that leads
+    to a known output gets a row: its output code (1 accepting, 0 rejecting, -1 unknown) and the rows of its
+    successors per letter, or -1 if the successor is missing or does not lead to a known output. Other nodes cannot
+    show apartness, so they are left out.
+    Rows are updated for the stale nodes only: the nodes with a new known output in their subtree and their ancestors.
+    """
+
+    def __init__(self, alphabet):
+        self.letter_index = {letter: i for i, letter in enumerate(alphabet)}
+        self.alphabet = list(alphabet)
+        self.row = dict()
+        self.outputs = np.full(64, -1, dtype=np.int8)
+        self.successors = np.full((64, len(alphabet)), -1, dtype=np.int64)
+        self.stale = set()
+
+    def mark_stale(self, node):
+        # The ancestors of a stale node are stale already
+        while node is not None and node not in self.stale:
+            self.stale.add(node)
+            node = node.parent
+
+    def _grow(self, size):
+        capacity = len(self.outputs)
+        while capacity < size:
+            capacity *= 2
+        if capacity == len(self.outputs):
+            return
+        outputs = np.full(capacity, -1, dtype=np.int8)
+        outputs[:len(self.outputs)] = self.outputs
+        successors = np.full((capacity, len(self.alphabet)), -1, dtype=np.int64)
+        successors[:len(self.successors)] = self.successors
+        self.outputs, self.successors = outputs, successors
+
+    def refresh(self):
+        """
+        Bring the rows of the stale nodes up to date.
+        """
+        if not self.stale:
+            return
+        for node in self.stale:
+            if node.leads_to_known and node not in self.row:
+                self.row[node] = len(self.row)
+        self._grow(len(self.row))
+        for node in self.stale:
+            row = self.row.get(node)
+            if row is None:
+                continue
+            self.outputs[row] = 1 if node.output is True else 0 if node.output is False else -1
+            for letter, successor in node.successor_items():
+                self.successors[row, self.letter_index[letter]] = self.row.get(successor, -1)
+        self.stale = set()
+
+    def rows(self, nodes):
+        return np.array([self.row.get(node, -1) for node in nodes], dtype=np.int64)
+
+    def apart(self, firsts, seconds):
+        """
+        Check the pairs (firsts[i], seconds[i]) for apartness in one lockstep BFS over all pairs.
+        Returns a boolean array with an entry per pair.
+        """
+        self.refresh()
+        first, second = self.rows(firsts), self.rows(seconds)
+        pair = np.nonzero((first >= 0) & (second >= 0))[0]
+        first, second = first[pair], second[pair]
+        result = np.zeros(len(firsts), dtype=bool)
+        while len(pair) > 0:
+            first_outputs, second_outputs = self.outputs[first], self.outputs[second]
+            result[pair[(first_outputs >= 0) & (second_outputs >= 0) & (first_outputs != second_outputs)]] = True
+            # Continue with the successors present in both subtrees of the pairs that are not apart yet
+            open_pairs = ~result[pair]
+            first_successors = self.successors[first[open_pairs]]
+            second_successors = self.successors[second[open_pairs]]
+            rows, letters = np.nonzero((first_successors >= 0) & (second_successors >= 0))
+            pair = pair[open_pairs][rows]
+            first, second = first_successors[rows, letters], second_successors[rows, letters]
+        return result
+
+    def distinguishing_sequences(self, group):
+        """
+        Yields the sequences after which at least 2 nodes of the group have different known outputs, in BFS order,
+        like Apartness.get_distinguishing_sequences. Every level of the BFS is handled at once.
+        """
+        if len(group) < 2:
+            return
+        self.refresh()
+        members = self.rows(group)[None, :]
+        sequences = [[]]
+        while len(sequences) > 0:
+            outputs = np.where(members >= 0, self.outputs[members], -1)
+            distinguishing = (outputs == 0).any(axis=1) & (outputs == 1).any(axis=1)
+            for i in np.nonzero(distinguishing)[0]:
+                yield sequences[i]
+            # Rows of the next level in the order (sequence, letter), with at least 2 members left
+            successors = np.where(members[:, :, None] >= 0, self.successors[members], -1)
+            successors = successors.transpose(0, 2, 1).reshape(-1, members.shape[1])
+            keep = np.nonzero((successors >= 0).sum(axis=1) >= 2)[0]
+            num_letters = len(self.alphabet)
+            sequences = [sequences[k // num_letters] + [self.alphabet[k % num_letters]] for k in keep]
+            members = successors[keep]
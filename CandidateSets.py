@@ -0,0 +1,155 @@
+class CandidateSets:
+    """
+    The basis candidates of the frontier nodes, stored as bitmasks. Every basis node gets a bit when it enters the
+    basis, which is never reused. A frontier node only stores the bits of the basis nodes it was found apart from, its
+    candidates are the bits of the current basis without those. Adding a node to the basis, or removing one, is
+    therefore a single update of the basis mask instead of an update of every candidate set.
+    Reading the candidates of a node builds a frozenset of basis nodes, so the sets can be used as before. Loops over
+    many frontier nodes use the masks instead and only turn the bits they need into basis nodes. Changes go through
+    exclude, add_basis and remove_basis.
+    Per bit, the frontier nodes that have its basis node as candidate are kept as well, so the nodes with a candidate
+    among some basis nodes are found without looking at the other frontier nodes.
+    """
+
+    def __init__(self):
+        # Excluded bits per frontier node, in the order in which the nodes were added
+        self.excluded = dict()
+        self.basis_mask = 0
+        self.bits = dict()
+        self.basis_of_bit = []
+        # Frontier nodes per bit that have the basis node of the bit as candidate, empty for bits out of the basis
+        self.holders = []
+
+    def __len__(self):
+        return len(self.excluded)
+
+    def __contains__(self, node):
+        return node in self.excluded
+
+    def __iter__(self):
+        return iter(self.excluded)
+
+    def __getitem__(self, node):
+        return self.materialize(self.mask(node))
+
+    def get(self, node, default=None):
+        if node not in self.excluded:
+            return default
+        return self[node]
+
+    def items(self):
+        for node in self.excluded:
+            yield node, self[node]
+
+    def masks(self):
+        """
+        Iterate over the frontier nodes and the masks of their candidates.
+        """
+        basis_mask = self.basis_mask
+        for node, excluded in self.excluded.items():
+            yield node, basis_mask & ~excluded
+
+    def materialize(self, mask):
+        return frozenset(self.nodes_of(mask))
+
+    def nodes_of(self, mask):
+        """
+        The basis nodes of the bits in a mask, in the order of their bits.
+        """
+        return [self.basis_of_bit[bit] for bit in self.bits_of(mask)]
+
+    def only_candidate(self, node):
+        """
+        The candidate of a frontier node with a single candidate.
+        """
+        return self.basis_of_bit[self.mask(node).bit_length() - 1]
+
+    @staticmethod
+    def bits_of(mask):
+        """
+        Iterate over the bits set in a mask.
+        """
+        while mask:
+            lowest = mask & -mask
+            yield lowest.bit_length() - 1
+            mask ^= lowest
+
+    def basis_mask_of(self, basis_nodes):
+        mask = 0
+        for basis_node in basis_nodes:
+            mask |= 1 << self.bits[basis_node]
+        return mask
+
+    def nodes_with_candidate_in(self, mask):
+        """
+        The frontier nodes with a candidate among the basis nodes of the mask.
+        """
+        nodes = set()
+        for bit in self.bits_of(mask & self.basis_mask):
+            nodes.update(self.holders[bit])
+        return nodes
+
+    def mask(self, node):
+        return self.basis_mask & ~self.excluded[node]
+
+    def count(self, node):
+        """
+        Number of candidates of a frontier node.
+        """
+        return self.mask(node).bit_count()
+
+    def has_candidate(self, node, basis_node):
+        return (self.mask(node) >> self.bits[basis_node]) & 1 == 1
+
+    def is_only_candidate(self, node, basis_node):
+        return node in self.excluded and self.mask(node) == 1 << self.bits[basis_node]
+
+    def add_node(self, node):
+        """
+        Add a frontier node, with all basis nodes as candidates.
+        """
+        self.excluded[node] = 0
+        for bit in self.bits_of(self.basis_mask):
+            self.holders[bit].add(node)
+
+    def remove_node(self, node):
+        for bit in self.bits_of(self.mask(node)):
+            self.holders[bit].discard(node)
+        del self.excluded[node]
+
+    def exclude(self, node, basis_nodes):
+        """
+        Remove basis nodes from the candidates of a frontier node.
+        """
+        excluded = self.excluded[node]
+        for basis_node in basis_nodes:
+            excluded |= 1 << self.bits[basis_node]
+        for bit in self.bits_of(self.mask(node) & excluded):
+            self.holders[bit].discard(node)
+        self.excluded[node] = excluded
+
+    def add_basis(self, basis_node):
+        """
+        Add a basis node, it becomes a candidate of every frontier node.
+        """
+        self.bits[basis_node] = len(self.basis_of_bit)
+        self.basis_of_bit.append(basis_node)
+        self.basis_mask |= 1 << self.bits[basis_node]
+        self.holders.append(set(self.excluded))
+
+    def remove_basis(self, basis_node):
+        """
+        Remove a basis node from the basis and from all candidates.
+        """
+        bit = self.bits.pop(basis_node)
+        self.basis_mask &= ~(1 << bit)
+        self.holders[bit] = set()
+
+    def index_holders(self):
+        """
+        Rebuild the frontier nodes per bit from the excluded bits, after those were set directly.
+        """
+        self.holders = [set() for _ in self.basis_of_bit]
+        for node in self.excluded:
+            for bit in self.bits_of(self.mask(node)):
+                self.holders[bit].add(node)
@@ -0,0 +1,230 @@
+from array import array
+
+
+class CompactTree:
+    """
+    Observation tree stored as a struct of arrays. A node is an integer id, its output, parent, input and depth are
+    entries of typed arrays and its successors a row of a flat array with a column per letter of the alphabet, -1 if
+    the successor is missing. The successors are also linked in the order in which they were added, through the first
+    and last child and the next sibling of every node, so they are iterated without looking at the empty columns.
+    Letters and outputs are interned as indices. Access sequences are not stored, they are reconstructed from the
+    parents when asked for.
+    The rest of the learner sees the nodes through CompactNode views, which have the interface of MooreNode. Views are
+    made when they are asked for and compare equal if they are on the same node, so they are used as dict keys as
+    before while the tree itself keeps no object per node.
+    """
+
+    def __init__(self, alphabet):
+        self.alphabet = list(alphabet)
+        self.letter_index = {letter: i for i, letter in enumerate(self.alphabet)}
+        # Interned outputs, looked up by identity as True == 1 for a dict
+        self.output_values = [None, True, False, "unknown"]
+
+        # Index 0 is unused, node ids start at 1 like MooreNode
+        self.outputs = array("B", [0])
+        self.parents = array("i", [-1])
+        self.inputs = array("i", [-1])
+        self.depths = array("i", [0])
+        self.leads_to_known = bytearray(1)
+        self.versions = array("q", [0])
+        self.empty_row = array("i", [-1] * len(self.alphabet))
+        self.successors = array("i", self.empty_row)
+        self.first_child = array("i", [-1])
+        self.last_child = array("i", [-1])
+        self.next_sibling = array("i", [-1])
+        self.root = CompactNode(self, self.new_node(-1, -1))
+
+    def __len__(self):
+        return len(self.outputs) - 1
+
+    def new_node(self, parent, letter):
+        """
+        Add a node with unknown output, returns its id. A node without parent is not linked into the tree.
+        """
+        node_id = len(self.outputs)
+        self.outputs.append(0)
+        self.parents.append(parent)
+        self.inputs.append(letter)
+        self.depths.append(self.depths[parent] + 1 if parent >= 0 else 0)
+        self.leads_to_known.append(0)
+        self.versions.append(0)
+        self.successors.extend(self.empty_row)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        if parent >= 0:
+            self.successors[parent * len(self.alphabet) + letter] = node_id
+            if self.last_child[parent] >= 0:
+                self.next_sibling[self.last_child[parent]] = node_id
+            else:
+                self.first_child[parent] = node_id
+            self.last_child[parent] = node_id
+        return node_id
+
+    def unlink(self, node_id):
+        """
+        Remove a node from the successors of its parent. Its entries and those of its subtree stay in the arrays.
+        """
+        parent = self.parents[node_id]
+        self.successors[parent * len(self.alphabet) + self.inputs[node_id]] = -1
+        previous = -1
+        child = self.first_child[parent]
+        while child != node_id:
+            previous, child = child, self.next_sibling[child]
+        following = self.next_sibling[node_id]
+        if previous >= 0:
+            self.next_sibling[previous] = following
+        else:
+            self.first_child[parent] = following
+        if following < 0:
+            self.last_child[parent] = previous
+        self.next_sibling[node_id] = -1
+
+    def intern_output(self, output):
+        for i, value in enumerate(self.output_values):
+            if value is output or (type(value) is type(output) and value == output):
+                return i
+        self.output_values.append(output)
+        return len(self.output_values) - 1
+
+    def successor_ids(self, node_id):
+        """
+        Iterate over the ids of the successors of a node, in the order in which they were added.
+        """
+        next_sibling = self.next_sibling
+        child = self.first_child[node_id]
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+    def access_sequence(self, node_id):
+        sequence = [None] * self.depths[node_id]
+        for i in range(len(sequence) - 1, -1, -1):
+            sequence[i] = self.alphabet[self.inputs[node_id]]
+            node_id = self.parents[node_id]
+        return sequence
+
+
+class CompactNode:
+    """
+    View on a node of a CompactTree, with the interface of MooreNode.
+    """
+    __slots__ = ['tree', 'id']
+
+    def __init__(self, tree, node_id):
+        self.tree = tree
+        self.id = node_id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, CompactNode) and self.id == other.id and self.tree is other.tree
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def output(self):
+        return self.tree.output_values[self.tree.outputs[self.id]]
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.id]
+        return CompactNode(self.tree, parent) if parent >= 0 else None
+
+    @property
+    def input_to_parent(self):
+        letter = self.tree.inputs[self.id]
+        return self.tree.alphabet[letter] if letter >= 0 else None
+
+    @property
+    def depth(self):
+        return self.tree.depths[self.id]
+
+    @property
+    def access_sequence(self):
+        return self.tree.access_sequence(self.id)
+
+    @property
+    def leads_to_known(self):
+        return bool(self.tree.leads_to_known[self.id])
+
+    @property
+    def version(self):
+        return self.tree.versions[self.id]
+
+    @property
+    def successors(self):
+        """ The successors by input, as a new dict in the order in which they were added """
+        return dict(self.successor_items())
+
+    def successor_items(self):
+        """ Iterate over the inputs and successors, in the order in which they were added """
+        tree = self.tree
+        alphabet = tree.alphabet
+        inputs = tree.inputs
+        for successor in tree.successor_ids(self.id):
+            yield alphabet[inputs[successor]], CompactNode(tree, successor)
+
+    def set_output(self, output):
+        """ Sets the output, returns whether a new known output was set """
+        tree = self.tree
+        changed = (output is True or output is False) and self.output is not output
+        if changed:
+            node = self.id
+            while node >= 0:
+                tree.versions[node] += 1
+                node = tree.parents[node]
+        tree.outputs[self.id] = tree.intern_output(output)
+        if output is True or output is False:
+            node = self.id
+            tree.leads_to_known[node] = 1
+            while tree.parents[node] >= 0 and not tree.leads_to_known[tree.parents[node]]:
+                node = tree.parents[node]
+                tree.leads_to_known[node] = 1
+        return changed
+
+    def restore(self, output, leads_to_known, version):
+        """ Sets the state of the node from a snapshot, without updating its ancestors """
+        self.tree.outputs[self.id] = self.tree.intern_output(output)
+        self.tree.leads_to_known[self.id] = 1 if leads_to_known else 0
+        self.tree.versions[self.id] = version
+
+    def get_successor(self, input_val):
+        """ Returns the successor node for the given input """
+        letter = self.tree.letter_index.get(input_val)
+        if letter is None:
+            return None
+        successor = self.tree.successors[self.id * len(self.tree.alphabet) + letter]
+        return CompactNode(self.tree, successor) if successor >= 0 else None
+
+    def remove_successor(self, input_val):
+        """ Removes the successor node for the given input, with its subtree. Its entries in the arrays stay. """
+        tree = self.tree
+        successor = tree.successors[self.id * len(tree.alphabet) + tree.letter_index[input_val]]
+        tree.unlink(successor)
+
+    def extend_and_get(self, inp, output):
+        """ Extend the node with a new successor and return the successor node """
+        successor = self.get_successor(inp)
+        if successor is not None:
+            return successor
+        successor = CompactNode(self.tree, self.tree.new_node(self.id, self.tree.letter_index[inp]))
+        successor.set_output(output)
+        return successor
+
+    @property
+    def id_counter(self):
+        return len(self.tree)
+
+    def __str__(self):
+        successors = self.successors
+        if self.output is None and len(successors) == 1:
+            # skip printing this node and print the child instead.
+            return str(list(successors.values())[0])
+        result = "node " + str(self.access_sequence) + " / " + str(self.output)
+        for input_val, successor in successors.items():
+            result += "\n" + str(input_val) + ":\n"
+            result += "\t" + str(successor).replace("\n", "\n\t")
+        return result
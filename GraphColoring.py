@@ -0,0 +1,143 @@
+from collections import deque
+
+from Apartness import Apartness
+
+
+class GraphColoring:
+    """
+    Hypothesis search as a coloring of the inconsistency graph: nodes that are apart get different states.
+    The basis nodes are pairwise apart and a frontier node is apart from the basis nodes outside its candidates.
+    Apartness between frontier nodes is only computed for the frontier nodes with the fewest candidates.
+    """
+
+    # Frontier nodes that are checked for apartness with each other, and their maximum number of candidates
+    MAX_FRONTIER_NODES = 64
+    MAX_CANDIDATES = 2
+
+    @staticmethod
+    def apart_frontier_pairs(ob_tree):
+        """
+        Find the pairs of frontier nodes with few candidates that are apart. This only reads the tree: in
+        compatibility mode no experiments are run, as the candidates are not updated again before the solver runs.
+        """
+        candidate_sets = ob_tree.frontier_to_basis_dict
+        frontier = [node for node in candidate_sets
+                    if node.leads_to_known and candidate_sets.count(node) <= GraphColoring.MAX_CANDIDATES]
+        frontier.sort(key=lambda node: (candidate_sets.count(node), node.id))
+        frontier = frontier[:GraphColoring.MAX_FRONTIER_NODES]
+
+        pairs = []
+        for i, node in enumerate(frontier):
+            for other in frontier[i + 1:]:
+                if Apartness.states_are_incompatible(node, other, ob_tree, experiment=False):
+                    pairs.append((node, other))
+        return pairs
+
+    @staticmethod
+    def find_clique(ob_tree, apart_pairs):
+        """
+        Greedily find a large set of pairwise apart nodes, each of which needs its own state in the hypothesis.
+        Every node of the graph is used once as the start of the clique.
+        """
+        basis = ob_tree.guaranteed_basis
+        neighbours = {node: set(basis) - {node} for node in basis}
+        for node, other in apart_pairs:
+            for frontier_node in (node, other):
+                if frontier_node not in neighbours:
+                    candidates = ob_tree.frontier_to_basis_dict[frontier_node]
+                    neighbours[frontier_node] = {basis_node for basis_node in basis if basis_node not in candidates}
+                    for basis_node in neighbours[frontier_node]:
+                        neighbours[basis_node].add(frontier_node)
+            neighbours[node].add(other)
+            neighbours[other].add(node)
+
+        order = sorted(neighbours, key=lambda node: -len(neighbours[node]))
+        best = list(basis)
+        for start in order:
+            clique = [start]
+            for node in order:
+                if node is not start and all(node in neighbours[member] for member in clique):
+                    clique.append(node)
+            if len(clique) > len(best):
+                best = clique
+        return best
+
+    @staticmethod
+    def _allowed(ob_tree, node, state, basis_index, outputs):
+        """
+        Check the constraints of a single node in the given state.
+        """
+        if node in basis_index:
+            return basis_index[node] == state
+        candidate_sets = ob_tree.frontier_to_basis_dict
+        if state < len(basis_index) and not candidate_sets.has_candidate(node, ob_tree.guaranteed_basis[state]):
+            return False
+        return not ob_tree.is_known(node) or outputs[state] is None or outputs[state] == node.output
+
+    @staticmethod
+    def _fits(ob_tree, node, state, basis_index, transitions, outputs):
+        """
+        Check if the subtree of the node fits the partial hypothesis when the node is in the given state, following
+        the transitions that are already fixed.
+        """
+        stack = [(node, state)]
+        while stack:
+            node, state = stack.pop()
+            if not GraphColoring._allowed(ob_tree, node, state, basis_index, outputs):
+                return False
+            for letter, successor in node.successor_items():
+                target = transitions[state].get(letter)
+                if target is not None and successor.leads_to_known:
+                    stack.append((successor, target))
+        return True
+
+    @staticmethod
+    def find_hypothesis(ob_tree):
+        """
+        Color the observation tree without a solver. The tree is walked in BFS order, so the state of a node is forced
+        by the transition of its parent once that transition is fixed. Otherwise the node gets the first state whose
+        transitions fit its subtree: a basis candidate, a free state that is already used or a new free state.
+        Returns the transition and output mapping, or None twice if the greedy coloring gets stuck.
+        """
+        size = ob_tree.size
+        basis_index = {node: i for i, node in enumerate(ob_tree.guaranteed_basis)}
+        if basis_index.get(ob_tree.root) != 0:
+            return None, None
+        transitions = [dict() for _ in range(size)]
+        outputs = [None for _ in range(size)]
+        used_states = len(basis_index)
+
+        state_of = {ob_tree.root: 0}
+        queue = deque([ob_tree.root])
+        while queue:
+            node = queue.popleft()
+            state = state_of[node]
+            if not GraphColoring._allowed(ob_tree, node, state, basis_index, outputs):
+                return None, None
+            if ob_tree.is_known(node):
+                outputs[state] = node.output
+
+            for letter, successor in node.successor_items():
+                if not successor.leads_to_known:
+                    continue
+                target = transitions[state].get(letter)
+                if target is None:
+                    if successor in basis_index:
+                        options = [basis_index[successor]]
+                    else:
+                        candidates = sorted(basis_index[c] for c in ob_tree.frontier_to_basis_dict[successor])
+                        options = candidates + list(range(len(basis_index), min(used_states + 1, size)))
+                    for option in options:
+                        if GraphColoring._fits(ob_tree, successor, option, basis_index, transitions, outputs):
+                            target = option
+                            break
+                    if target is None:
+                        return None, None
+                    transitions[state][letter] = target
+                    used_states = max(used_states, target + 1)
+                state_of[successor] = target
+                queue.append(successor)
+
+        transition_mapping = [[transitions[i].get(letter, 0) for letter in ob_tree.alphabet] for i in range(size)]
+        output_mapping = [outputs[i] is True for i in range(size)]
+        return transition_mapping, output_mapping
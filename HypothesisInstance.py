@@ -0,0 +1,114 @@
+from collections import deque
+
+
+class HypothesisInstance:
+    """
+    Snapshot of the constraints a hypothesis has to satisfy, taken from the observation tree.
+    Nodes are numbered in BFS order and only nodes that can reach a known output are included.
+    The instance only holds plain lists, so the encodings do not depend on the tree itself.
+    """
+
+    def __init__(self, size, num_letters, parents, letters, outputs, basis, candidates, apart_pairs=None):
+        self.size = size
+        self.num_letters = num_letters
+        # Parent index and alphabet index of the input leading to each node, -1 for the root
+        self.parents = parents
+        self.letters = letters
+        # True or False for known outputs, None otherwise
+        self.outputs = outputs
+        # Node index of every basis node, the i-th basis node is mapped to state i
+        self.basis = basis
+        # (node index, basis states) for every frontier node, which maps to one of those or to a free state
+        self.candidates = candidates
+        # (node index, node index) for pairs of frontier nodes that are apart, and so map to different states
+        self.apart_pairs = apart_pairs if apart_pairs is not None else []
+
+    def __len__(self):
+        return len(self.parents)
+
+    @staticmethod
+    def from_tree(ob_tree):
+        """
+        Flatten the observation tree. Returns the instance and the tree nodes in the order of their index.
+        """
+        letter_index = {letter: j for j, letter in enumerate(ob_tree.alphabet)}
+        nodes = [ob_tree.root]
+        node_index = {ob_tree.root: 0}
+        parents = [-1]
+        letters = [-1]
+        outputs = [ob_tree.root.output if ob_tree.is_known(ob_tree.root) else None]
+
+        queue = deque([ob_tree.root])
+        while queue:
+            node = queue.popleft()
+            idx = node_index[node]
+            for letter, successor in node.successor_items():
+                # Check if successor can reach a known node
+                if not successor.leads_to_known:
+                    continue
+                queue.append(successor)
+                node_index[successor] = len(nodes)
+                nodes.append(successor)
+                parents.append(idx)
+                letters.append(letter_index[letter])
+                outputs.append(successor.output if ob_tree.is_known(successor) else None)
+
+        basis = [node_index[node] for node in ob_tree.guaranteed_basis]
+        basis_index = {node: i for i, node in enumerate(ob_tree.guaranteed_basis)}
+        candidate_sets = ob_tree.frontier_to_basis_dict
+        # The candidates are sorted, so the encodings get the same input in every run
+        candidates = [(node_index[node], sorted(basis_index[c] for c in candidate_sets.nodes_of(mask)))
+                      for node, mask in candidate_sets.masks() if node in node_index]
+
+        instance = HypothesisInstance(ob_tree.size, len(ob_tree.alphabet), parents, letters, outputs, basis,
+                                      candidates)
+        return instance, nodes
+
+    def depths(self):
+        """
+        Length of the access sequence of every node.
+        """
+        depths = [0 for _ in range(len(self))]
+        for i in range(1, len(self)):
+            depths[i] = depths[self.parents[i]] + 1
+        return depths
+
+    def restrict(self, keep):
+        """
+        Instance with only the nodes in keep, which has to contain the basis and the parent of every node in it.
+        Returns the instance and the original index of each of its nodes.
+        """
+        nodes = sorted(keep)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        parents = [node_index.get(self.parents[node], -1) for node in nodes]
+        letters = [self.letters[node] for node in nodes]
+        outputs = [self.outputs[node] for node in nodes]
+        basis = [node_index[node] for node in self.basis]
+        candidates = [(node_index[node], candidates) for node, candidates in self.candidates if node in node_index]
+        apart_pairs = [(node_index[i], node_index[j]) for i, j in self.apart_pairs
+                       if i in node_index and j in node_index]
+        instance = HypothesisInstance(self.size, self.num_letters, parents, letters, outputs, basis, candidates,
+                                      apart_pairs)
+        return instance, nodes
+
+    def violations(self, transition_mapping, output_mapping):
+        """
+        Run the mappings on every node and return the nodes whose constraints are not satisfied. Both nodes of an apart
+        pair that is mapped to one state are returned, so the pair stays in an instance restricted to them.
+        """
+        basis_state = {node: i for i, node in enumerate(self.basis)}
+        candidates = dict(self.candidates)
+        states = [basis_state.get(0, 0) for _ in range(len(self))]
+        violated = []
+        for i in range(len(self)):
+            if i > 0:
+                states[i] = transition_mapping[states[self.parents[i]]][self.letters[i]]
+            state = states[i]
+            if i in basis_state and basis_state[i] != state:
+                violated.append(i)
+            elif i in candidates and state < len(self.basis) and state not in candidates[i]:
+                violated.append(i)
+            elif self.outputs[i] is not None and output_mapping[state] != self.outputs[i]:
+                violated.append(i)
+        violated.extend(k for i, j in self.apart_pairs if states[i] == states[j] for k in (i, j))
+        return violated
@@ -46,6 +46,60 @@ class DfaSUL(SUL):
             self.num_successful_queries -= 1
         return out
 
+    @staticmethod
+    def prefix_trie(words: list) -> list:
+        """
+        The words merged into a trie. A node is a list of its successors by letter and the indices of the words that
+        end in it.
+        """
+        root = [dict(), []]
+        for index, word in enumerate(words):
+            node = root
+            for letter in word:
+                node = node[0].setdefault(letter, [dict(), []])
+            node[1].append(index)
+        return root
+
+    def run_batch(self, words: list) -> tuple[list, int]:
+        """
+        Runs the automaton on a batch of words, by walking the trie of the words depth first. The automaton goes back
+        to the state after a prefix instead of being reset, so shared prefixes are stepped through once.
+        Returns the outputs of the automaton after the words, "unknown" without automaton, and the number of steps.
+        """
+        outputs = [None] * len(words)
+        steps = 0
+        if self.automaton is None:
+            stack = [(self.prefix_trie(words), None, "unknown")]
+        else:
+            self.automaton.reset_to_initial()
+            output = self.automaton.step(None)
+            stack = [(self.prefix_trie(words), self.automaton.current_state, output)]
+        while stack:
+            (successors, ends), state, output = stack.pop()
+            for index in ends:
+                outputs[index] = output
+            for letter, successor in successors.items():
+                steps += 1
+                if self.automaton is None:
+                    stack.append((successor, None, "unknown"))
+                else:
+                    self.automaton.current_state = state
+                    output = self.automaton.step(letter)
+                    stack.append((successor, self.automaton.current_state, output))
+        return outputs, steps
+
+    def query_batch(self, words: list) -> list:
+        """
+        Performs the membership queries of a batch of words, which are counted like separate queries. The steps of
+        the prefixes that words share are taken once.
+        Returns the outputs in the order of the words.
+        """
+        outputs, steps = self.run_batch(words)
+        self.num_queries += len(words)
+        self.num_successful_queries += sum(1 for output in outputs if output != "unknown")
+        self.num_steps += steps
+        return outputs
+
 
 class IncompleteDfaSUL(DfaSUL):
     def __init__(self, words, automaton: Dfa = None):
@@ -73,6 +127,25 @@ class IncompleteDfaSUL(DfaSUL):
         else:
             return outputs[-1]
 
+    def query_batch(self, words: list) -> list:
+        """
+        Performs the membership queries of a batch of words, with the outputs of the given words first and those of
+        the automaton, or "unknown", otherwise. The steps of the prefixes that words share are taken once.
+        Returns the outputs in the order of the words.
+        """
+        automaton_outputs, steps = self.run_batch(words)
+        outputs = []
+        for word, automaton_output in zip(words, automaton_outputs):
+            saved_output = self.word_known(word)
+            if saved_output is None:
+                self.add_word(word, automaton_output)
+                saved_output = automaton_output
+            outputs.append(saved_output)
+        self.num_queries += len(words)
+        self.num_successful_queries += sum(1 for output in outputs if output != "unknown")
+        self.num_steps += steps
+        return outputs
+
     def pre(self):
         self.input_walk = []
         if self.automaton is None:
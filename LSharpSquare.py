@@ -4,18 +4,47 @@ from aalpy.base import Oracle
 from aalpy.base import SUL
 
 from ObservationTreeSquare import ObservationTreeSquare
+from Snapshot import Snapshot
 
 
 def run_lsharp_square(alphabet: list, sul: SUL, eq_oracle: Oracle, return_data: bool = False, solver_timeout: int = 200,
-                      replace_basis: bool = True, use_compatibility: bool = False):
-    ob_tree = ObservationTreeSquare(alphabet, sul, solver_timeout, replace_basis, use_compatibility)
-    start_time = time.time()
+                      replace_basis: bool = True, use_compatibility: bool = False, incremental: bool = False,
+                      encoding: str = "smt", symmetry_breaking: bool = False, reuse_hypothesis: bool = False,
+                      portfolio: int = 0, size_search: str = "linear", graph_coloring: bool = False,
+                      lazy_depth: int | None = None, unsat_cores: bool = False, numpy_apartness: bool = False,
+                      witness_ranking: bool = False, lazy_experiments: bool = False, compact_tree: bool = False,
+                      hash_consing: bool = False, prune_unknown: bool = False, expansion: str = "product",
+                      expansion_depth: int = 3, expansion_budget: int | None = None, snapshot: str | None = None,
+                      checkpoint: str | None = None):
+    """
+    Learn a DFA of the SUL. With checkpoint, a snapshot of the learner is written to that path after every
+    counterexample. With snapshot, the learner resumes from a snapshot instead of starting from an empty tree. It has
+    to be given the same alphabet, SUL and options, and the time spent before the snapshot counts for the timeout.
+    """
+    ob_tree = ObservationTreeSquare(alphabet, sul, solver_timeout, replace_basis, use_compatibility,
+                                    incremental=incremental, encoding=encoding, symmetry_breaking=symmetry_breaking,
+                                    reuse_hypothesis=reuse_hypothesis, portfolio=portfolio, size_search=size_search,
+                                    graph_coloring=graph_coloring, lazy_depth=lazy_depth, unsat_cores=unsat_cores,
+                                    numpy_apartness=numpy_apartness, witness_ranking=witness_ranking,
+                                    lazy_experiments=lazy_experiments, compact_tree=compact_tree,
+                                    hash_consing=hash_consing, prune_unknown=prune_unknown, expansion=expansion,
+                                    expansion_depth=expansion_depth, expansion_budget=expansion_budget)
     timeout = solver_timeout
 
     eq_query_time = 0
     learning_rounds = 0
     validity_queries = 0
+    elapsed_time = 0
     hypothesis = None
+    if snapshot is not None:
+        counters = Snapshot.load(snapshot, ob_tree)
+        eq_query_time = counters["eq_query_time"]
+        learning_rounds = counters["learning_rounds"]
+        validity_queries = counters["validity_queries"]
+        elapsed_time = counters["elapsed_time"]
+        eq_oracle.num_queries = counters["eq_oracle_queries"]
+        eq_oracle.num_steps = counters["eq_oracle_steps"]
+    start_time = time.time() - elapsed_time
 
     # ob_tree.expand_frontier()
     # ob_tree.update_frontier_to_basis_dict()
@@ -48,13 +77,19 @@ def run_lsharp_square(alphabet: list, sul: SUL, eq_oracle: Oracle, return_data:
 
         # Process the counterexample and start a new learning round
         ob_tree.process_counter_example(cex, not last)
+        if checkpoint is not None:
+            Snapshot.save(checkpoint, ob_tree, {
+                "eq_query_time": eq_query_time, "learning_rounds": learning_rounds,
+                "validity_queries": validity_queries, "elapsed_time": time.time() - start_time,
+                "eq_oracle_queries": eq_oracle.num_queries, "eq_oracle_steps": eq_oracle.num_steps})
 
     total_time = time.time() - start_time
     smt_time = ob_tree.smt_time
     learning_time = total_time - eq_query_time - smt_time
 
     info = {'learning_rounds': learning_rounds, 'automaton_size': hypothesis.size if hypothesis else 0, # time
-        'learning_time': learning_time, 'smt_time': smt_time, 'eq_oracle_time': eq_query_time, 'total_time': total_time,
+        'learning_time': learning_time, 'smt_time': smt_time,
+        'smt_encode_time': ob_tree.smt_encode_time, 'eq_oracle_time': eq_query_time, 'total_time': total_time,
         # learning algorithm
         'queries_learning': sul.num_queries, 'successful_queries_learning': sul.num_successful_queries,
         'validity_query': validity_queries, # tree
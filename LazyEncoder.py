@@ -0,0 +1,65 @@
+import logging
+import time
+
+from pysmt.exceptions import SolverReturnedUnknownResultError
+
+
+class LazyEncoder:
+    """
+    Counterexample-guided encoding of large observation trees. Only the nodes up to a bounded depth below the basis
+    are encoded at first. The model is run on the whole tree and the nodes it contradicts are added, together with
+    their ancestors, until the model fits the whole tree. Deep nodes are mostly implied by the shallow ones.
+    """
+
+    @staticmethod
+    def find_hypothesis(instance, solver_timeout, encoder, depth, timings=None, unsat_core=None, **options):
+        """
+        Find a hypothesis for the instance with the given encoder, encoding nodes up to depth levels deeper than the
+        deepest basis node, and more where needed. All solver calls share the solver timeout.
+        Returns the transition and output mapping, or None twice if no hypothesis of the size exists, since a part of
+        the constraints being unsatisfiable makes all of them unsatisfiable.
+        The unsat core of the encoder is translated back to the nodes of the instance.
+        Raises SolverReturnedUnknownResultError if the solver times out.
+        """
+        start_time = time.time()
+        depths = instance.depths()
+        max_depth = max(depths[node] for node in instance.basis) + 1 + depth
+        keep = {i for i in range(len(instance)) if depths[i] <= max_depth}
+
+        encode_time = 0
+        while True:
+            remaining_timeout = solver_timeout - int((time.time() - start_time) * 1000)
+            if remaining_timeout <= 0:
+                raise SolverReturnedUnknownResultError
+            sub_instance, nodes = instance.restrict(keep)
+            sub_timings = dict()
+            if unsat_core is not None:
+                options["unsat_core"] = []
+            try:
+                transition_mapping, output_mapping = encoder.find_hypothesis(sub_instance, remaining_timeout,
+                                                                             timings=sub_timings, **options)
+            finally:
+                encode_time += sub_timings.get("encode", 0)
+                if timings is not None:
+                    timings["encode"] = encode_time
+            if transition_mapping is None:
+                if unsat_core is not None:
+                    unsat_core.extend(nodes[i] for i in options["unsat_core"])
+                return None, None
+
+            violated = instance.violations(transition_mapping, output_mapping)
+            if not violated:
+                return transition_mapping, output_mapping
+            logging.debug(f"Model contradicts {len(violated)} of {len(instance) - len(keep)} nodes left out, "
+                          f"encoding {len(keep)} of {len(instance)} nodes")
+            encoded = len(keep)
+            for node in violated:
+                while node != -1 and node not in keep:
+                    keep.add(node)
+                    node = instance.parents[node]
+            if len(keep) == encoded:
+                # The same model would come back, encode the whole tree instead
+                if encoded == len(instance):
+                    raise RuntimeError("The model of the whole instance contradicts it")
+                logging.debug("No node was added, encoding the whole tree")
+                keep = set(range(len(instance)))
@@ -1,6 +1,8 @@
 from aalpy.automata import MealyMachine, MealyState
 from aalpy.base.SUL import SUL
 
+from IncompleteDfaSUL import DfaSUL
+
 
 class MealyDfaSUL(SUL):
     def __init__(self, automaton: MealyMachine, missing: list):
@@ -52,11 +54,55 @@ class MealyDfaSUL(SUL):
             final output
 
         """
-        self.pre()
         self.num_queries += 1
-        self.num_successful_queries += 1
         self.num_steps += len(word)
+        output = self.evaluate(word)
+        if output != "unknown":
+            self.num_successful_queries += 1
+        return output
 
+    def query_batch(self, words: list) -> list:
+        """
+        Performs the membership queries of a batch of words, which are counted like separate queries. The words are
+        merged into a trie that is walked depth first, keeping the state and the verdict after every prefix, so the
+        steps of shared prefixes are taken once.
+        Returns the outputs in the order of the words.
+        """
+        root = DfaSUL.prefix_trie(words)
+        outputs = [None] * len(words)
+        input_alphabet = self.automaton.get_input_alphabet()
+        # A node of even depth has the state after its input/output pairs and their verdict, a node of odd depth has
+        # the input of its last, incomplete pair as well
+        stack = [(root, 0, self.automaton.initial_state, True, None)]
+        while stack:
+            (successors, ends), depth, state, verdict, input_letter = stack.pop()
+            for index in ends:
+                outputs[index] = verdict if depth % 2 == 0 else False
+            for letter, successor in successors.items():
+                self.num_steps += 1
+                if depth % 2 == 0:
+                    stack.append((successor, depth + 1, state, verdict, letter))
+                    continue
+                next_state, next_verdict = state, verdict
+                if verdict is True:
+                    if input_letter not in input_alphabet:
+                        next_verdict = False
+                    else:
+                        next_state = state.transitions[input_letter]
+                        if (state.state_id, next_state.state_id) in self.missing:
+                            next_verdict = "unknown"
+                        elif state.output_fun[input_letter] != letter:
+                            next_verdict = False
+                stack.append((successor, depth + 1, next_state, next_verdict, None))
+        self.num_queries += len(words)
+        self.num_successful_queries += sum(1 for output in outputs if output != "unknown")
+        return outputs
+
+    def evaluate(self, word: tuple):
+        """
+        The output of the word, without counting it as a query.
+        """
+        self.pre()
         if len(word) % 2 == 1:
             return False
 
@@ -71,9 +117,17 @@ class MealyDfaSUL(SUL):
             previous_state = current_state
             current_state = self.automaton.current_state.state_id
             if (previous_state, current_state) in self.missing:
-                self.num_successful_queries -= 1
                 return "unknown"
             if actual_output != expected_output:
                 return False
 
         return True
+
+    @staticmethod
+    def is_dead_prefix(word: tuple, output) -> bool:
+        """
+        Check from the output of the word, which the learner has observed already, if every extension of the word
+        gives the same output. A word of even length that is rejected has a wrong output or input in it, so all its
+        extensions are rejected as well. This follows from the encoding of the Mealy machine, not from its states.
+        """
+        return len(word) % 2 == 0 and output is False
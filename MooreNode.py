@@ -1,21 +1,32 @@
 class MooreNode:
-    _id_counter = 0
-    __slots__ = ['id', 'output', 'successors', 'parent', 'input_to_parent', 'access_sequence', 'leads_to_known']
+    __slots__ = ['id', 'output', 'successors', 'parent', 'input_to_parent', 'access_sequence', 'leads_to_known',
+                 'version', 'counter']
 
     def __init__(self, parent=None):
-        MooreNode._id_counter += 1
-        self.id = MooreNode._id_counter
+        # Ids are allocated per tree: a new root starts a counter, which is shared by all nodes below it
+        self.counter = parent.counter if parent is not None else [0]
+        self.counter[0] += 1
+        self.id = self.counter[0]
         self.output = None
         self.successors = {}
         self.parent = parent
         self.input_to_parent = None
         self.access_sequence = []
         self.leads_to_known = False
+        # Number of known outputs set in the subtree, used to invalidate cached apartness results
+        self.version = 0
 
     def __hash__(self):
         return hash(self.id)
 
     def set_output(self, output):
+        """ Sets the output, returns whether a new known output was set """
+        changed = (output is True or output is False) and self.output is not output
+        if changed:
+            node = self
+            while node is not None:
+                node.version += 1
+                node = node.parent
         self.output = output
         if output is True or output is False:
             self.leads_to_known = True
@@ -23,6 +34,13 @@ class MooreNode:
             while node.parent is not None and not node.parent.leads_to_known:
                 node = node.parent
                 node.leads_to_known = True
+        return changed
+
+    def restore(self, output, leads_to_known, version):
+        """ Sets the state of the node from a snapshot, without updating its ancestors """
+        self.output = output
+        self.leads_to_known = leads_to_known
+        self.version = version
 
     def add_successor(self, input_val, output_val, successor_node):
         """ Adds a successor node to the current node based on input """
@@ -32,12 +50,20 @@ class MooreNode:
         self.successors[input_val].set_output(output_val)
         self.successors[input_val].access_sequence = self.access_sequence + [input_val]
 
+    def successor_items(self):
+        """ Iterate over the inputs and successors, in the order in which they were added """
+        return self.successors.items()
+
     def get_successor(self, input_val):
         """ Returns the successor node for the given input """
         if input_val in self.successors:
             return self.successors[input_val]
         return None
 
+    def remove_successor(self, input_val):
+        """ Removes the successor node for the given input, with its subtree """
+        del self.successors[input_val]
+
     def extend_and_get(self, inp, output):
         """ Extend the node with a new successor and return the successor node """
         if inp in self.successors:
@@ -47,9 +73,13 @@ class MooreNode:
         successor_node.input_to_parent = inp
         return successor_node
 
+    @property
+    def depth(self):
+        return len(self.access_sequence)
+
     @property
     def id_counter(self):
-        return self._id_counter
+        return self.counter[0]
 
     def __str__(self):
         compact_counter_examples = True
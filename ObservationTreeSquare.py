@@ -1,33 +1,96 @@
+import heapq
 import itertools
 import logging
+import math
 import time
 from collections import deque
 
 from aalpy.automata import Dfa, DfaState
 from pysmt.exceptions import SolverReturnedUnknownResultError
-from pysmt.shortcuts import (Solver, Symbol, Function, Int, Bool, Or, GE, LT)
-from pysmt.typing import INT, BOOL, FunctionType
 
 from Apartness import Apartness
+from ApartnessCache import ApartnessCache
+from CandidateSets import CandidateSets
+from CompactTree import CompactTree
+from GraphColoring import GraphColoring
+from HypothesisInstance import HypothesisInstance
+from LazyEncoder import LazyEncoder
 from MooreNode import MooreNode
+from PrunedSubtrees import PrunedSubtrees
+from SatEncoder import SatEncoder
+from SmtEncoder import SmtEncoder
+from SmtSession import SmtSession
+from SolverPortfolio import SolverPortfolio
+from SubtreeSignatures import SubtreeSignatures
+from WitnessPlanner import WitnessPlanner
+from Z3Encoder import Z3Encoder
 
 test_cases_path = "Benchmarking/incomplete_dfa_benchmark/test_cases/"
 logging.basicConfig(level=logging.INFO, format=f"%(asctime)s %(levelname)s: %(message)s", datefmt="%H:%M:%S")
 
 
 class ObservationTreeSquare:
-    def __init__(self, alphabet, sul, solver_timeout, replace_basis, use_compatibility):
+    # Number of UNKNOWN answers after which a size is skipped in the size search, even though it is not proven UNSAT
+    MAX_UNKNOWN_ANSWERS = 2
+    # Number of input paths of the frontier expansion whose queries are sent to the sul in one batch
+    QUERY_BATCH_SIZE = 1024
+
+    def __init__(self, alphabet, sul, solver_timeout, replace_basis, use_compatibility, incremental=False,
+                 encoding="smt", symmetry_breaking=False, reuse_hypothesis=False, portfolio=0, size_search="linear",
+                 graph_coloring=False, lazy_depth=None, unsat_cores=False, numpy_apartness=False,
+                 witness_ranking=False, lazy_experiments=False, compact_tree=False, hash_consing=False,
+                 prune_unknown=False, expansion="product", expansion_depth=3, expansion_budget=None):
         """
         Initializes the observation tree with a root node.
         """
+        if encoding not in ["smt", "sat", "z3"]:
+            raise ValueError(f"Unknown encoding {encoding}")
+        if incremental and encoding != "smt":
+            raise ValueError("The incremental session only supports the smt encoding")
+        if incremental and portfolio:
+            raise ValueError("The incremental session cannot be combined with a portfolio")
+        if lazy_depth is not None and (incremental or portfolio):
+            raise ValueError("Lazy encoding cannot be combined with the incremental session or a portfolio")
+        if unsat_cores and (encoding == "sat" or incremental or portfolio):
+            raise ValueError("Unsat cores need the smt or z3 encoding, without incremental session or portfolio")
+        if size_search not in ["linear", "bounded", "galloping"]:
+            raise ValueError(f"Unknown size search {size_search}")
+        if expansion not in ["product", "prefix"]:
+            raise ValueError(f"Unknown expansion {expansion}")
+        if expansion_depth < 1:
+            raise ValueError("The expansion depth must be at least 1")
+        # Options that shape the observation tree and the search, a snapshot is only resumed with the same ones
+        self.options = {"replace_basis": replace_basis, "use_compatibility": use_compatibility,
+                        "incremental": incremental, "encoding": encoding, "symmetry_breaking": symmetry_breaking,
+                        "reuse_hypothesis": reuse_hypothesis, "portfolio": portfolio, "size_search": size_search,
+                        "graph_coloring": graph_coloring, "lazy_depth": lazy_depth, "unsat_cores": unsat_cores,
+                        "numpy_apartness": numpy_apartness, "witness_ranking": witness_ranking,
+                        "lazy_experiments": lazy_experiments, "compact_tree": compact_tree,
+                        "hash_consing": hash_consing, "prune_unknown": prune_unknown, "expansion": expansion,
+                        "expansion_depth": expansion_depth, "expansion_budget": expansion_budget}
         self.automaton_type = "dfa"
         self.solver_timeout = solver_timeout * 1000
         self.replace_basis = replace_basis
         self.use_compatibility = use_compatibility
-
-        # Logger information
+        self.incremental = incremental
+        self.encoding = encoding
+        self.symmetry_breaking = symmetry_breaking
+        self.reuse_hypothesis = reuse_hypothesis
+        self.size_search = size_search
+        self.graph_coloring = graph_coloring
+        self.lazy_depth = lazy_depth
+        self.unsat_cores = unsat_cores
+        self.witness_ranking = witness_ranking
+        self.lazy_experiments = lazy_experiments
+        self.expansion = expansion
+        self.expansion_depth = expansion_depth
+        self.expansion_budget = expansion_budget
+        # Queries made by expand_frontier in this learning round, checked against the budget
+        self.expansion_queries = 0
+
+        # Logger information, smt_time includes the time spent on encoding
         self.smt_time = 0
-        MooreNode._id_counter = 0
+        self.smt_encode_time = 0
 
         # Initialize tree
         self.alphabet = alphabet
@@ -35,12 +98,52 @@ class ObservationTreeSquare:
         self.outputAlphabet = [True, False, "unknown"]
         self.states_list = []
 
-        self.root = MooreNode()
-        self.root.set_output(self.sul.query([]))
+        # Nodes whose subtree has new known outputs since the last update of the frontier, with all their ancestors
+        self.dirty_nodes = set()
+        if numpy_apartness:
+            # numpy is only needed for this option
+            from ArrayTree import ArrayTree
+            self.array_tree = ArrayTree(alphabet)
+        else:
+            self.array_tree = None
+        # The compact tree stores the nodes in arrays, behind views with the interface of MooreNode
+        self.root = CompactTree(alphabet).root if compact_tree else MooreNode()
+        self.set_node_output(self.root, self.sul.query([]))
 
         self.size = 1
+        # Smallest size that is not proven UNSAT or given up after UNKNOWN answers, and the UNKNOWN answers per size
+        self.size_lower_bound = 1
+        self.unknown_answers = dict()
+        # Answer of the solver in the last call to find_hypothesis: "sat", "unsat" or "unknown"
+        self.last_answer = None
+        # Frontier nodes whose constraints are in the unsat core of the last UNSAT answer, shallowest first
+        self.core_nodes = []
         self.guaranteed_basis = [self.root]
-        self.frontier_to_basis_dict = dict()
+        self.frontier_to_basis_dict = CandidateSets()
+        self.frontier_to_basis_dict.add_basis(self.root)
+        # Indexes for promote_node_to_basis: the basis as a set, the frontier nodes without candidates and, per basis
+        # node, the frontier nodes with only that candidate. The heaps are ordered by depth and may hold outdated
+        # entries, which are skipped when they come up. The nodes in the heaps are kept with their candidate, or
+        # None if they have none, so a node is only pushed again when that changes.
+        self.basis_nodes = {self.root}
+        self.isolated_nodes = []
+        self.single_candidate_nodes = dict()
+        self.indexed_nodes = dict()
+        self.heap_entries = itertools.count()
+        self.apartness_cache = ApartnessCache()
+        # Canonical ids of the subtrees, apartness is then computed once per pair of distinct subtrees
+        self.subtree_signatures = SubtreeSignatures(alphabet) if hash_consing else None
+        # Subtrees without known outputs that were pruned after a counterexample, their queries are not repeated
+        self.pruned_subtrees = PrunedSubtrees(alphabet) if prune_unknown else None
+        # Depth up to which the prefix expansion has queried every word below a node, math.inf below a dead prefix
+        self.explored_depth = dict()
+
+        # Solver session shared by all calls to find_hypothesis
+        self.smt_session = SmtSession(self) if incremental else None
+        # Solver processes racing on every call to find_hypothesis, these use their own encoding and options
+        self.portfolio = SolverPortfolio(portfolio) if portfolio else None
+        # Transition and output mapping of the last hypothesis that was found
+        self.last_mapping = None
 
     def insert_observation(self, inputs, output):
         """
@@ -49,19 +152,44 @@ class ObservationTreeSquare:
         node = self.root
         for inp in inputs:
             node = node.extend_and_get(inp, None)
-        node.set_output(output)
+        self.set_node_output(node, output)
 
     def insert_observation_sequence(self, inputs, outputs):
         """
         Insert an observation into the tree using a sequence of inputs and their corresponding outputs.
         """
         node = self.root
-        for inp, output in zip(inputs, outputs):
-            node = node.extend_and_get(inp, output)
-            node.set_output(output)
+        for position, (inp, output) in enumerate(zip(inputs, outputs)):
+            if self.pruned_subtrees is not None and node.get_successor(inp) is None and node not in self.basis_nodes:
+                # Do not grow the tree again if the rest of the inputs is in a pruned subtree, with the same outputs
+                flags = self.pruned_subtrees.lookup(node, inputs[position:])
+                if len(flags) == len(inputs) - position and all(
+                        output is None or (output == "unknown" and flag == PrunedSubtrees.UNKNOWN)
+                        for output, flag in zip(outputs[position:], flags)):
+                    break
+            node = node.extend_and_get(inp, None)
+            self.set_node_output(node, output)
             if not node in self.frontier_to_basis_dict:
-                candidates = {candidate for candidate in self.guaranteed_basis}
-                self.frontier_to_basis_dict[node] = candidates
+                self.frontier_to_basis_dict.add_node(node)
+                self.index_candidates(node)
+
+    def set_node_output(self, node, output):
+        """
+        Set the output of a node, and mark it and its ancestors dirty if the output is a new known output.
+        """
+        if node.set_output(output):
+            self.mark_dirty(node)
+
+    def mark_dirty(self, node):
+        """
+        Mark a node and its ancestors dirty, so their basis candidates are checked in the next update.
+        """
+        # The ancestors of a dirty node are dirty already
+        if self.array_tree is not None:
+            self.array_tree.mark_stale(node)
+        while node is not None and node not in self.dirty_nodes:
+            self.dirty_nodes.add(node)
+            node = node.parent
 
     def experiment(self, inputs):
         """
@@ -143,84 +271,258 @@ class ObservationTreeSquare:
             node = queue.popleft()
             if node.output != "unknown":
                 count += 1
-            for successor in node.successors.values():
+            for _, successor in node.successor_items():
                 queue.append(successor)
         return count
 
+    def prune_unknown_subtrees(self):
+        """
+        Remove the subtrees in which no node has a known output, and keep them as markers in pruned_subtrees. The basis
+        nodes, their successors and their ancestors stay, as identification starts from the successors of the basis.
+        Returns the number of removed nodes.
+        """
+        protected = set()
+        for basis_node in self.guaranteed_basis:
+            protected.update(successor for _, successor in basis_node.successor_items())
+            node = basis_node
+            while node is not None and node not in protected:
+                protected.add(node)
+                node = node.parent
+
+        removed = []
+        queue = deque([self.root])
+        while queue:
+            node = queue.popleft()
+            for letter, successor in list(node.successor_items()):
+                if successor.leads_to_known or successor in protected:
+                    queue.append(successor)
+                    continue
+                self.pruned_subtrees.prune(node, letter)
+                subtree = [successor]
+                for subtree_node in subtree:
+                    subtree.extend(successor for _, successor in subtree_node.successor_items())
+                node.remove_successor(letter)
+                removed.extend(subtree)
+
+        for node in removed:
+            if node in self.frontier_to_basis_dict:
+                self.frontier_to_basis_dict.remove_node(node)
+            self.dirty_nodes.discard(node)
+            self.explored_depth.pop(node, None)
+        # Drop the index entries of the removed nodes
+        removed = set(removed)
+        self.isolated_nodes = [entry for entry in self.isolated_nodes if entry[-1] not in removed]
+        heapq.heapify(self.isolated_nodes)
+        for heap in self.single_candidate_nodes.values():
+            heap[:] = [entry for entry in heap if entry[-1] not in removed]
+            heapq.heapify(heap)
+        for node in removed:
+            self.indexed_nodes.pop(node, None)
+        logging.debug(f"Pruned {len(removed)} nodes without known outputs")
+        return len(removed)
+
     def update_basis_candidates(self, frontier_node):
         """
         Update the basis candidates for a specific frontier node.
         """
         candidates = self.frontier_to_basis_dict[frontier_node]
-        new_candidates = {node for node in candidates if
-                          not Apartness.states_are_incompatible(frontier_node, node, self)}
-        self.frontier_to_basis_dict[frontier_node] = new_candidates
+        apart_nodes = [node for node in candidates if Apartness.states_are_incompatible(frontier_node, node, self)]
+        self.frontier_to_basis_dict.exclude(frontier_node, apart_nodes)
+        self.index_candidates(frontier_node)
 
     def update_frontier_to_basis_dict(self):
         """
         Update the basis candidates for all frontier nodes.
         """
-        self.update_frontier_to_basis_dict_dfs(self.root)
+        if self.use_compatibility:
+            self.update_frontier_to_basis_dict_dfs(self.root)
+        else:
+            self.update_dirty_frontier_nodes()
+        self.dirty_nodes = set()
+
+    def update_dirty_frontier_nodes(self):
+        """
+        Update the basis candidates for the pairs in which one of the nodes is dirty. Apartness only depends on the
+        subtrees of the two nodes, so the other pairs are unchanged since the last update. Only the dirty frontier
+        nodes and the frontier nodes with a dirty basis node as candidate are visited.
+        Unlike the DFS, this also updates the nodes below a frontier node without candidates. Incompatibility runs
+        experiments and looks outside the subtrees, so it keeps using the DFS.
+        With numpy apartness, the pairs that are not in the apartness cache are checked together on the array tree.
+        """
+        candidate_sets = self.frontier_to_basis_dict
+        dirty_basis_mask = candidate_sets.basis_mask_of(node for node in self.guaranteed_basis
+                                                        if node in self.dirty_nodes)
+        dirty_frontier = {node for node in self.dirty_nodes if node in candidate_sets}
+        apart_nodes = dict()
+        pairs = []
+        for frontier_node in dirty_frontier | candidate_sets.nodes_with_candidate_in(dirty_basis_mask):
+            mask = candidate_sets.mask(frontier_node)
+            changed = candidate_sets.nodes_of(mask if frontier_node in dirty_frontier else mask & dirty_basis_mask)
+            if self.array_tree is None:
+                apart_nodes[frontier_node] = {node for node in changed if
+                                              Apartness.states_are_incompatible(frontier_node, node, self)}
+                continue
+            apart_nodes[frontier_node] = set()
+            for node in changed:
+                apart = self.apartness_cache.get(frontier_node, node)
+                if apart is None:
+                    pairs.append((frontier_node, node))
+                elif apart:
+                    apart_nodes[frontier_node].add(node)
+        if pairs:
+            firsts, seconds = zip(*pairs)
+            for frontier_node, node, apart in zip(firsts, seconds, self.array_tree.apart(firsts, seconds)):
+                self.apartness_cache.put(frontier_node, node, bool(apart))
+                if apart:
+                    apart_nodes[frontier_node].add(node)
+        for frontier_node, nodes in apart_nodes.items():
+            self.frontier_to_basis_dict.exclude(frontier_node, nodes)
+            self.index_candidates(frontier_node)
 
     def update_frontier_to_basis_dict_dfs(self, node):
         if not node.leads_to_known:
             return
-        if not node in self.guaranteed_basis:
+        if not node in self.basis_nodes:
             self.update_basis_candidates(node)
-            if len(self.frontier_to_basis_dict[node]) == 0:
+            if self.frontier_to_basis_dict.count(node) == 0:
                 return
-        for successor in node.successors.values():
+        for _, successor in node.successor_items():
             self.update_frontier_to_basis_dict_dfs(successor)
 
-    def promote_node_to_basis(self):
+    @staticmethod
+    def bfs_key(node):
         """
-        If an isolated frontier node is found, reset the queue and restart from the guaranteed basis plus the isolated node.
+        Key that orders nodes like a BFS of the tree: by depth, then by the ids on the path from the root. Siblings are
+        visited in the order in which they were added, which is the order of their ids.
         """
-        queue = deque([self.root])
-        while queue:
-            iso_frontier_node = queue.popleft()
-            for successor in iso_frontier_node.successors.values():
-                queue.append(successor)
-            if iso_frontier_node in self.guaranteed_basis:
+        path = []
+        while node is not None:
+            path.append(node.id)
+            node = node.parent
+        path.reverse()
+        return len(path), path
+
+    def index_candidates(self, node):
+        """
+        Add a frontier node to the index of its candidate count, if it has at most one candidate and is not in the
+        index with the same candidate already.
+        """
+        count = self.frontier_to_basis_dict.count(node)
+        if count > 1:
+            return
+        candidate = self.frontier_to_basis_dict.only_candidate(node) if count == 1 else None
+        if node in self.indexed_nodes and self.indexed_nodes[node] == candidate:
+            return
+        self.indexed_nodes[node] = candidate
+        heap = self.isolated_nodes if count == 0 else self.single_candidate_nodes.setdefault(candidate, [])
+        heapq.heappush(heap, (node.depth, node.id, next(self.heap_entries), node))
+
+    def reset_candidate_index(self):
+        self.isolated_nodes = []
+        self.single_candidate_nodes = dict()
+        self.indexed_nodes = dict()
+
+    def first_indexed(self, heap, candidate):
+        """
+        The entry of the first node in BFS order in a heap of the index that still has the candidate, None for the
+        heap of nodes without candidates, or None. The shallowest entries are ordered by their BFS key, outdated
+        entries are dropped.
+        """
+        candidate_sets = self.frontier_to_basis_dict
+
+        def valid(entry):
+            node = entry[-1]
+            if candidate is None:
+                return node in candidate_sets and candidate_sets.count(node) == 0
+            return candidate_sets.is_only_candidate(node, candidate)
+
+        shallowest = []
+        while heap and (not shallowest or heap[0][0] == shallowest[0][0]):
+            entry = heapq.heappop(heap)
+            if valid(entry):
+                shallowest.append(entry)
+            elif entry[-1] in self.indexed_nodes and self.indexed_nodes[entry[-1]] == candidate:
+                del self.indexed_nodes[entry[-1]]
+        for entry in shallowest:
+            heapq.heappush(heap, entry)
+        if not shallowest:
+            return None
+        return min(shallowest, key=lambda entry: self.bfs_key(entry[-1]))
+
+    def find_isolated_node(self):
+        """
+        The first frontier node without candidates in BFS order, or None.
+        """
+        entry = self.first_indexed(self.isolated_nodes, None)
+        return entry[-1] if entry is not None else None
+
+    def find_replacement(self):
+        """
+        The first frontier node in BFS order whose only candidate is deeper in the tree, together with that candidate,
+        or None twice. The nodes per candidate are ordered by depth first, so only the first valid one is checked.
+        """
+        best = None
+        for candidate in self.guaranteed_basis:
+            entry = self.first_indexed(self.single_candidate_nodes.get(candidate, []), candidate)
+            if entry is None or entry[-1].depth >= candidate.depth:
                 continue
-            basis_list = self.frontier_to_basis_dict[iso_frontier_node]
-            if not basis_list:
-                self.guaranteed_basis.append(iso_frontier_node)
-                # Update the candidates
-                del self.frontier_to_basis_dict[iso_frontier_node]
-                for node, candidates in self.frontier_to_basis_dict.items():
-                    candidates.add(iso_frontier_node)
-                logging.debug(f"Increasing basis size to {len(self.guaranteed_basis)}")
-                self.size = max(self.size, len(self.guaranteed_basis))
-                return True
+            key = self.bfs_key(entry[-1])
+            if best is None or key < best[0]:
+                best = key, entry[-1], candidate
+        if best is None:
+            return None, None
+        return best[1], best[2]
+
+    def promote_node_to_basis(self):
+        """
+        Promote the first isolated frontier node in BFS order to the basis. Otherwise, with basis replacement, swap
+        the first frontier node in BFS order with a single candidate deeper in the tree with that candidate.
+        """
+        iso_frontier_node = self.find_isolated_node()
+        if iso_frontier_node is not None:
+            self.guaranteed_basis.append(iso_frontier_node)
+            self.basis_nodes.add(iso_frontier_node)
+            # Update the candidates, the new basis node is a candidate of every frontier node. The isolated nodes now
+            # have it as single candidate and the other index entries are outdated.
+            self.frontier_to_basis_dict.remove_node(iso_frontier_node)
+            isolated = dict.fromkeys(entry[-1] for entry in self.isolated_nodes
+                                     if entry[-1] in self.frontier_to_basis_dict and
+                                     self.frontier_to_basis_dict.count(entry[-1]) == 0)
+            self.frontier_to_basis_dict.add_basis(iso_frontier_node)
+            self.reset_candidate_index()
+            for node in isolated:
+                self.index_candidates(node)
+            self.mark_dirty(iso_frontier_node)
+            logging.debug(f"Increasing basis size to {len(self.guaranteed_basis)}")
+            self.size = max(self.size, len(self.guaranteed_basis))
+            return True
 
         if not self.replace_basis:
             return False
 
-        queue = deque([self.root])
-        while queue:
-            iso_frontier_node = queue.popleft()
-            for successor in iso_frontier_node.successors.values():
-                queue.append(successor)
-            if iso_frontier_node in self.guaranteed_basis:
-                continue
-            basis_list = self.frontier_to_basis_dict[iso_frontier_node]
-            if len(basis_list) == 1:
-                candidate = next(iter(self.frontier_to_basis_dict[iso_frontier_node]))
-                if len(self.get_access_sequence(candidate)) <= len(self.get_access_sequence(iso_frontier_node)):
-                    continue
-                self.guaranteed_basis.remove(candidate)
-                self.guaranteed_basis.append(iso_frontier_node)
-                # Update the candidates
-                del self.frontier_to_basis_dict[iso_frontier_node]
-                for node, candidates in self.frontier_to_basis_dict.items():
-                    if candidate in candidates:
-                        candidates.remove(candidate)
-                    if not Apartness.states_are_incompatible(node, iso_frontier_node, self, experiment=False):
-                        candidates.add(iso_frontier_node)
-                self.frontier_to_basis_dict[candidate] = {node for node in self.guaranteed_basis}
-                return True
-        return False
+        iso_frontier_node, candidate = self.find_replacement()
+        if iso_frontier_node is None:
+            return False
+        self.guaranteed_basis.remove(candidate)
+        self.guaranteed_basis.append(iso_frontier_node)
+        self.basis_nodes.remove(candidate)
+        self.basis_nodes.add(iso_frontier_node)
+        del self.single_candidate_nodes[candidate]
+        # Update the candidates
+        candidate_sets = self.frontier_to_basis_dict
+        candidate_sets.remove_node(iso_frontier_node)
+        candidate_sets.remove_basis(candidate)
+        candidate_sets.add_basis(iso_frontier_node)
+        for node in candidate_sets:
+            if Apartness.states_are_incompatible(node, iso_frontier_node, self, experiment=False):
+                candidate_sets.exclude(node, [iso_frontier_node])
+            if candidate_sets.count(node) <= 1:
+                self.index_candidates(node)
+        candidate_sets.add_node(candidate)
+        self.index_candidates(candidate)
+        self.mark_dirty(iso_frontier_node)
+        self.mark_dirty(candidate)
+        return True
 
     def make_frontiers_identified(self):
         """
@@ -239,12 +541,14 @@ class ObservationTreeSquare:
         """
         Identify a specific frontier node
         """
-        if len(self.frontier_to_basis_dict[frontier_node]) == 0:
+        if self.frontier_to_basis_dict.count(frontier_node) == 0:
             return False
 
         inputs_to_frontier = self.get_transfer_sequence(self.root, frontier_node)
 
         witnesses = self._get_witnesses_bfs(frontier_node)
+        if self.witness_ranking:
+            witnesses = WitnessPlanner.rank(self, frontier_node, witnesses)
         for witness_seq in witnesses:
             inputs = inputs_to_frontier + witness_seq
             outputs, extended = self._get_output_sequence(inputs, query_mode='final')
@@ -294,120 +598,306 @@ class ObservationTreeSquare:
 
         return hypothesis
 
-    def find_hypothesis(self):
+    def hypothesis_is_consistent(self, transition_mapping, output_mapping):
         """
-        Find a hypothesis consistent with the observation tree, using the pySMT solver.
-        There are 2 free functions: "out" and "m" and 1 bound function "delta".
+        Check if the mappings satisfy the same constraints as a hypothesis found by the solver: the basis nodes are
+        in their own state, the frontier nodes in a candidate or in a state outside the basis, and every known output
+        agrees with the state the node is in.
         """
-        logging.debug(f"Trying to build hypothesis of size {self.size}")
-        logging.debug(f"Basis size: {len(self.guaranteed_basis)}, Frontier size: {len(self.frontier_to_basis_dict)}")
-        start_smt_time = time.time()
+        if len(transition_mapping) != self.size:
+            return False
+        basis_index = {node: i for i, node in enumerate(self.guaranteed_basis)}
+        letter_index = {letter: j for j, letter in enumerate(self.alphabet)}
 
-        s = Solver(name="z3", solver_options={"timeout": self.solver_timeout})  # or another backend supported by pySMT
+        queue = deque([(self.root, 0)])
+        while queue:
+            node, state = queue.popleft()
+            if node in basis_index and basis_index[node] != state:
+                return False
+            if node in self.frontier_to_basis_dict and state < len(self.guaranteed_basis):
+                if not self.frontier_to_basis_dict.has_candidate(node, self.guaranteed_basis[state]):
+                    return False
+            if self.is_known(node) and output_mapping[state] != node.output:
+                return False
+            for letter, successor in node.successor_items():
+                if successor.leads_to_known:
+                    queue.append((successor, transition_mapping[state][letter_index[letter]]))
+        return True
 
-        # Function declarations
-        delta = Symbol("delta", FunctionType(INT, [INT, INT]))  # δ: int × int → int
-        dfa_output = Symbol("dfa_output", FunctionType(BOOL, [INT]))  # dfa_output: int → bool
-        states_mapping = Symbol("states_mapping", FunctionType(INT, [INT]))  # states_mapping: int → int
+    def find_hypothesis(self):
+        """
+        Find a hypothesis consistent with the observation tree, using the selected encoding.
+        With reuse_hypothesis, the last hypothesis is returned without calling the solver if it is still consistent,
+        and otherwise passed to the z3 encoding as a starting point.
+        """
+        if self.reuse_hypothesis and self.last_mapping is not None and self.hypothesis_is_consistent(
+                *self.last_mapping):
+            logging.debug("Previous hypothesis is still consistent")
+            self.last_answer = "sat"
+            return self.last_mapping
+
+        if self.graph_coloring:
+            transition_mapping, output_mapping = GraphColoring.find_hypothesis(self)
+            if transition_mapping is not None and self.hypothesis_is_consistent(transition_mapping, output_mapping):
+                logging.debug(f"Coloring found a hypothesis of size {self.size}")
+                self.last_answer = "sat"
+                self.last_mapping = transition_mapping, output_mapping
+                return transition_mapping, output_mapping
 
-        # Flatten the tree to a list of nodes
-        queue = deque([self.root])
-        nodes = [self.root]
+        if self.incremental:
+            transition_mapping, output_mapping = self.smt_session.find_hypothesis()
+            if transition_mapping is not None:
+                self.last_mapping = transition_mapping, output_mapping
+            return transition_mapping, output_mapping
 
-        while queue:
-            node = queue.popleft()
-            idx = nodes.index(node)
-            for letter, successor in node.successors.items():
-                # Check if successor can reach a known node
-                if not successor.leads_to_known:
-                    continue
-                queue.append(successor)
-                s.add_assertion(Function(states_mapping, [Int(len(nodes))]).Equals(
-                    Function(delta, [Function(states_mapping, [Int(idx)]), Int(self.alphabet.index(letter))])))
-                nodes.append(successor)
-
-        # Basis nodes map to different states
-        for i, node in enumerate(self.guaranteed_basis):
-            s.add_assertion(Function(states_mapping, [Int(nodes.index(node))]).Equals(Int(i)))
-
-        # Force known outputs
-        for i, node in enumerate(nodes):
-            if self.is_known(node):
-                val = Bool(node.output)
-                s.add_assertion(Function(dfa_output, [Function(states_mapping, [Int(i)])]).Iff(val))
-
-        for node, candidates in self.frontier_to_basis_dict.items():
-            if node not in nodes:
-                continue
-            s.add_assertion(
-                Or([Function(states_mapping, [Int(nodes.index(node))]).Equals(Int(self.guaranteed_basis.index(c))) for c
-                    in candidates] + [Function(states_mapping, [Int(nodes.index(node))]).Equals(Int(i)) for i in
-                                      range(len(self.guaranteed_basis), self.size)]))
-
-        # Correct delta
-        for i in range(self.size):
-            for j in range(len(self.alphabet)):
-                d_ij = Function(delta, [Int(i), Int(j)])
-                s.add_assertion(GE(d_ij, Int(0)))
-                s.add_assertion(LT(d_ij, Int(self.size)))
+        logging.debug(f"Trying to build hypothesis of size {self.size}")
+        logging.debug(f"Basis size: {len(self.guaranteed_basis)}, Frontier size: {len(self.frontier_to_basis_dict)}")
+        start_smt_time = time.time()
 
+        instance, nodes = HypothesisInstance.from_tree(self)
+        self.smt_encode_time += time.time() - start_smt_time
+        timings = dict()
         try:
             logging.debug("Solving...")
-            if not s.solve():
-                logging.debug("UNSAT")
-                logging.debug(f"No hypothesis of size {self.size} exists")
-                self.smt_time += time.time() - start_smt_time
-                return None, None
+            if self.portfolio is not None:
+                transition_mapping, output_mapping = self.portfolio.find_hypothesis(instance, self.solver_timeout)
             else:
-                logging.debug("SAT")
-                self.smt_time += time.time() - start_smt_time
-                model = s.get_model()
-
-                transition_mapping = [[0 for _ in range(len(self.alphabet))] for _ in range(self.size)]
-                output_mapping = [False for _ in range(self.size)]
-
-                for i in range(self.size):
-                    val = model.get_value(Function(dfa_output, [Int(i)]))
-                    output_mapping[i] = str(val) == "True"
-                    for j in range(len(self.alphabet)):
-                        val = model.get_value(Function(delta, [Int(i), Int(j)]))
-                        transition_mapping[i][j] = int(str(val))
-
-                return transition_mapping, output_mapping
+                encoder = {"smt": SmtEncoder, "sat": SatEncoder, "z3": Z3Encoder}[self.encoding]
+                options = {"symmetry_breaking": self.symmetry_breaking, "timings": timings}
+                if self.unsat_cores:
+                    options["unsat_core"] = []
+                if self.encoding == "z3" and self.reuse_hypothesis:
+                    options["hint"] = self.last_mapping
+                if self.lazy_depth is None:
+                    transition_mapping, output_mapping = encoder.find_hypothesis(instance, self.solver_timeout,
+                                                                                 **options)
+                else:
+                    transition_mapping, output_mapping = LazyEncoder.find_hypothesis(
+                        instance, self.solver_timeout, encoder, self.lazy_depth, **options)
         except SolverReturnedUnknownResultError:
+            self.smt_encode_time += timings.get("encode", 0)
             self.smt_time += time.time() - start_smt_time
             logging.debug("TIMEOUT")
             logging.debug(f"Could not find hypothesis of size {self.size}")
+            self.last_answer = "unknown"
             return None, None
 
+        self.smt_time += time.time() - start_smt_time
+        self.smt_encode_time += timings.get("encode", 0)
+        if transition_mapping is None:
+            logging.debug("UNSAT")
+            logging.debug(f"No hypothesis of size {self.size} exists")
+            self.last_answer = "unsat"
+            if self.unsat_cores:
+                self.set_core_nodes([nodes[i] for i in options["unsat_core"]])
+        else:
+            logging.debug("SAT")
+            self.last_answer = "sat"
+            self.last_mapping = transition_mapping, output_mapping
+            self.core_nodes = []
+        return transition_mapping, output_mapping
+
+    def set_core_nodes(self, core):
+        """
+        Keep the frontier nodes of an unsat core, to be identified before the next call to the solver.
+        Output constraints of basis nodes are in the core as well, but basis nodes cannot be identified.
+        """
+        core_nodes = {node for node in core if node in self.frontier_to_basis_dict}
+        self.core_nodes = sorted(core_nodes, key=lambda node: (node.depth, node.id))
+        logging.debug(f"Unsat core with {len(self.core_nodes)} frontier nodes")
+
+    def identify_core_nodes(self):
+        """
+        Run identification experiments on the frontier nodes of the last unsat core. These nodes are not only the
+        successors of the basis, but any node in the tree whose candidates or output made the size UNSAT.
+        """
+        extended = False
+        core_nodes, self.core_nodes = self.core_nodes, []
+        for frontier_node in core_nodes:
+            # The node may have become a basis node since the core was found
+            if frontier_node not in self.frontier_to_basis_dict:
+                continue
+            while self.identify_frontier(frontier_node):
+                extended = True
+                self.update_basis_candidates(frontier_node)
+        return extended
+
+    def apply_clique_bound(self):
+        """
+        Raise the size to the largest set of pairwise apart nodes that was found. The apart pairs of frontier nodes are
+        only used for this bound: as extra constraints they made the z3 encoding slower.
+        """
+        apart_pairs = GraphColoring.apart_frontier_pairs(self)
+        clique = GraphColoring.find_clique(self, apart_pairs)
+        if len(clique) > self.size:
+            logging.debug(f"Clique of {len(clique)} apart nodes, increasing size from {self.size}")
+            self.size = len(clique)
+        self.size_lower_bound = max(self.size_lower_bound, len(clique))
+
+    def search_hypothesis_size(self):
+        """
+        Search the smallest size with a hypothesis, without extending the observation tree between sizes.
+        An UNSAT answer is a permanent lower bound: a hypothesis can be padded with unreachable states, so no smaller
+        size has one either, and new observations only add constraints. An UNKNOWN answer skips the size for this
+        round only, until it has given MAX_UNKNOWN_ANSWERS of them. The round ends at the second UNKNOWN answer, so
+        the learner gets to check its time budget.
+        With galloping, the step to the next size doubles after every failure, and the skipped sizes are bisected
+        once a hypothesis is found.
+        Returns the mappings of the smallest hypothesis found, with self.size set to its size.
+        """
+        # The basis nodes are pairwise apart, so they need their own states
+        low = max(self.size_lower_bound, len(self.guaranteed_basis))
+        high, mappings = None, (None, None)
+        probe, step = low, 1
+        unknown_answers = 0
+        while high is None or low < high:
+            self.size = probe
+            transition_mapping, output_mapping = self.find_hypothesis()
+            if self.last_answer == "sat":
+                high, mappings = probe, (transition_mapping, output_mapping)
+            else:
+                if self.last_answer == "unsat":
+                    self.size_lower_bound = max(self.size_lower_bound, probe + 1)
+                else:
+                    unknown_answers += 1
+                    self.unknown_answers[probe] = self.unknown_answers.get(probe, 0) + 1
+                    if probe == self.size_lower_bound and self.unknown_answers[probe] >= self.MAX_UNKNOWN_ANSWERS:
+                        self.size_lower_bound += 1
+                    if high is None and unknown_answers > 1:
+                        return None, None
+                low = probe + 1
+                if high is None:
+                    probe += step
+                    if self.size_search == "galloping":
+                        step *= 2
+            if high is not None:
+                probe = (low + high) // 2
+        self.size = high
+        return mappings
+
     def build_hypothesis(self):
         """
         Builds the hypothesis which will be sent to the SUL and checks consistency
         """
         while True:
             self.find_adequate_observation_tree()
-            transition_mapping, output_mapping = self.find_hypothesis()
+            if self.graph_coloring:
+                self.apply_clique_bound()
+            if self.size_search == "linear":
+                transition_mapping, output_mapping = self.find_hypothesis()
+            else:
+                transition_mapping, output_mapping = self.search_hypothesis_size()
             if transition_mapping is not None:
                 hypothesis = self.construct_hypothesis(transition_mapping=transition_mapping,
                                                        output_mapping=output_mapping)
                 return hypothesis
             else:
-                self.size += 1
+                if self.size_search == "linear":
+                    self.size += 1
                 return None
 
     def expand_frontier(self):
         """
-        Extend the frontier self.size - len(self.guaranteed_basis) steps from the guaranteed basis
+        Extend the frontier self.size - len(self.guaranteed_basis) + self.expansion_depth steps from the guaranteed
+        basis, with all words of that length or with the prefix expansion. Stops once the queries of this round reach
+        the expansion budget.
         """
-        length = self.size - len(self.guaranteed_basis) + 3
-        # length = 2
-        # Loop over words of length 'length'
-        for word in itertools.product(self.alphabet, repeat=length):
+        length = self.size - len(self.guaranteed_basis) + self.expansion_depth
+        start_queries = self.sul.num_queries
+        if self.expansion == "prefix" or self.expansion_budget is not None:
+            # Identification starts from the successors of the basis, so they are queried even if the budget is spent
+            self.query_frontier()
+        if self.expansion == "prefix":
             for node in self.guaranteed_basis:
-                access = self.get_access_sequence(node)
-                inputs = access + list(word)
-                outputs, _ = self._get_output_sequence(inputs, query_mode="full")
-                self.insert_observation_sequence(inputs, outputs)
+                if not self.expand_prefixes(node, self.get_access_sequence(node), length, start_queries):
+                    break
+        else:
+            # Loop over words of length 'length', their queries are sent in batches
+            batch, words = [], dict()
+            for word in itertools.product(self.alphabet, repeat=length):
+                if self.expansion_budget_spent(start_queries, len(words)):
+                    break
+                for node in self.guaranteed_basis:
+                    access = self.get_access_sequence(node)
+                    inputs = access + list(word)
+                    outputs, pending = self._get_known_outputs(inputs, query_mode="full")
+                    batch.append((inputs, outputs, pending))
+                    words.update(dict.fromkeys(tuple(inputs[:inp_num + 1]) for inp_num in pending))
+                if len(batch) >= self.QUERY_BATCH_SIZE:
+                    self.insert_batch(batch, words)
+                    batch, words = [], dict()
+            self.insert_batch(batch, words)
+        self.expansion_queries += self.sul.num_queries - start_queries
+
+    def query_frontier(self):
+        """
+        Query the successors of the basis nodes that have no output yet. Their paths are inserted even if they are
+        known, as insert_observation_sequence keeps the nodes on them in frontier_to_basis_dict.
+        """
+        batch, words = [], dict()
+        for node in self.guaranteed_basis:
+            access = self.get_access_sequence(node)
+            for letter in self.alphabet:
+                inputs = access + [letter]
+                outputs, pending = self._get_known_outputs(inputs, query_mode="full")
+                batch.append((inputs, outputs, pending))
+                words.update(dict.fromkeys(tuple(inputs[:inp_num + 1]) for inp_num in pending))
+        self.insert_batch(batch, words)
+
+    def expansion_budget_spent(self, start_queries, queued=0):
+        """
+        Check if the queries of expand_frontier in this round, including the current call and the queued queries of
+        its batch, reached the budget.
+        """
+        if self.expansion_budget is None:
+            return False
+        if self.expansion_queries + self.sul.num_queries - start_queries + queued < self.expansion_budget:
+            return False
+        logging.debug(f"Expansion budget of {self.expansion_budget} queries spent")
+        return True
+
+    def is_dead_prefix(self, node, inputs):
+        """
+        Check if the SUL tells, from the observed output of the node, that every extension of its inputs gives the same
+        output. This makes no query. SULs without this check have no dead prefixes.
+        """
+        is_dead_prefix = getattr(self.sul, "is_dead_prefix", None)
+        return is_dead_prefix is not None and is_dead_prefix(inputs, node.output)
+
+    def expand_prefixes(self, node, inputs, remaining, start_queries):
+        """
+        Query the words of length remaining below a node, depth first, so every prefix is walked once instead of once
+        per word. Skips the subtrees explored to that depth before, the words in pruned subtrees and the extensions of
+        dead prefixes. Returns False if the budget ran out before the subtree was explored.
+        """
+        explored = self.explored_depth.get(node, 0)
+        if explored == 0 and self.is_dead_prefix(node, inputs):
+            explored = math.inf
+            self.explored_depth[node] = explored
+        if explored >= remaining:
+            return True
+        # The successors without output are queried in one batch
+        batch, words = [], dict()
+        for letter in self.alphabet:
+            successor = node.get_successor(letter)
+            if successor is None or successor.output is None:
+                if self.expansion_budget_spent(start_queries, len(words)):
+                    self.insert_batch(batch, words)
+                    return False
+                word = inputs + [letter]
+                outputs, pending = self._get_known_outputs(word, query_mode="full")
+                batch.append((word, outputs, pending))
+                words.update(dict.fromkeys(tuple(word[:inp_num + 1]) for inp_num in pending))
+        self.insert_batch(batch, words)
+        for letter in self.alphabet:
+            successor = node.get_successor(letter)
+            if successor is None:
+                # Not inserted, the word is in a pruned subtree and its output is unknown
+                continue
+            if not self.expand_prefixes(successor, inputs + [letter], remaining - 1, start_queries):
+                return False
+        self.explored_depth[node] = remaining
+        return True
 
     def update_frontier(self):
         self.update_frontier_to_basis_dict()
@@ -417,6 +907,7 @@ class ObservationTreeSquare:
         Tries to find an observation tree,
         for which each frontier state is identified as much as possible.
         """
+        self.expansion_queries = 0
         self.expand_frontier()
         self.update_frontier_to_basis_dict()
         while self.promote_node_to_basis():
@@ -429,6 +920,12 @@ class ObservationTreeSquare:
                 self.expand_frontier()
                 self.update_frontier_to_basis_dict()
 
+        if self.identify_core_nodes():
+            self.update_frontier_to_basis_dict()
+            while self.promote_node_to_basis():
+                self.expand_frontier()
+                self.update_frontier_to_basis_dict()
+
     def process_counter_example(self, cex_inputs, output):
         """
         Inserts the counter example into the observation tree and searches for the
@@ -436,8 +933,10 @@ class ObservationTreeSquare:
         """
         cex_outputs, _ = self._get_output_sequence(cex_inputs, query_mode="full")
         self.insert_observation_sequence(cex_inputs, cex_outputs)
-        self.get_successor(cex_inputs).set_output(output)
+        self.set_node_output(self.get_successor(cex_inputs), output)
         self.update_frontier_to_basis_dict()
+        if self.pruned_subtrees is not None:
+            self.prune_unknown_subtrees()
         return
 
     def _get_output_sequence(self, inputs, query_mode="full"):
@@ -445,31 +944,75 @@ class ObservationTreeSquare:
         Returns the sequence of outputs corresponding to the input path.
         The knowledge is obtained from the observation tree or if not available via querying the sul.
         There are 3 query_modes: full, none and final. They allow you to restrict the querying to your needs
+        The missing outputs are queried in one batch.
+        """
+        outputs, pending = self._get_known_outputs(inputs, query_mode)
+        answers = self.query_batch([inputs[:inp_num + 1] for inp_num in pending])
+        queried = self._add_answers(inputs, outputs, pending, answers)
+        return outputs, queried
+
+    def _get_known_outputs(self, inputs, query_mode="full"):
+        """
+        Returns the outputs of the input path that are known without querying the sul, None for the others, and the
+        positions of the outputs that have to be queried in the query_mode.
         """
         assert query_mode in ["full", "none", "final"]
 
         outputs = []
-        queried = False
+        pending = []
         current_node = self.root
+        # Positions of the inputs that were answered "unknown" in a pruned subtree
+        pruned_unknown = set()
         for inp_num in range(len(inputs)):
             inp = inputs[inp_num]
             if current_node is not None:
+                if self.pruned_subtrees is not None:
+                    flags = self.pruned_subtrees.lookup(current_node, inputs[inp_num:])
+                    pruned_unknown.update(inp_num + i for i, flag in enumerate(flags) if flag == PrunedSubtrees.UNKNOWN)
                 current_node = current_node.get_successor(inp)
-            if current_node is None:
+            if inp_num in pruned_unknown and (current_node is None or current_node.output is None):
+                outputs.append("unknown")
+            elif current_node is None or current_node.output is None:
                 if query_mode == "full" or (inp_num == len(inputs) - 1 and query_mode == "final"):
-                    new_output = self.sul.query(inputs[:inp_num + 1])
-                    outputs.append(new_output)
-                    if new_output != "unknown":
-                        queried = True
-                else:
-                    outputs.append(None)
+                    pending.append(inp_num)
+                outputs.append(None)
             else:
-                if current_node.output is None and (
-                        query_mode == "full" or (inp_num == len(inputs) - 1 and query_mode == "final")):
-                    new_output = self.sul.query(inputs[:inp_num + 1])
-                    outputs.append(new_output)
-                    if new_output != "unknown":
-                        queried = True
-                else:
-                    outputs.append(current_node.output)
-        return outputs, queried
+                outputs.append(current_node.output)
+        return outputs, pending
+
+    @staticmethod
+    def _add_answers(inputs, outputs, pending, answers):
+        """
+        Fill in the queried outputs of the input path, returns whether one of them is not "unknown".
+        """
+        queried = False
+        for inp_num in pending:
+            outputs[inp_num] = answers[tuple(inputs[:inp_num + 1])]
+            if outputs[inp_num] != "unknown":
+                queried = True
+        return queried
+
+    def query_batch(self, words):
+        """
+        Query a batch of words with the query_batch of the sul, or one by one for suls without it, like plain aalpy
+        SULs. Every word is queried once. Returns the outputs by word, as tuple.
+        """
+        words = list(dict.fromkeys(tuple(word) for word in words))
+        if not words:
+            return dict()
+        query_batch = getattr(self.sul, "query_batch", None)
+        if query_batch is not None:
+            outputs = query_batch(words)
+        else:
+            outputs = [self.sul.query(word) for word in words]
+        return dict(zip(words, outputs))
+
+    def insert_batch(self, batch, words):
+        """
+        Query the words of a batch of input paths at once, then insert the paths in order. The batch has the input
+        paths with their known outputs and pending positions, from _get_known_outputs.
+        """
+        answers = self.query_batch(words)
+        for inputs, outputs, pending in batch:
+            self._add_answers(inputs, outputs, pending, answers)
+            self.insert_observation_sequence(inputs, outputs)
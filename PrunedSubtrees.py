@@ -0,0 +1,106 @@
+class PrunedSubtrees:
+    """
+    Markers of the subtrees that were pruned from the observation tree because none of their nodes has a known output.
+    A pruned subtree is kept per parent node and letter as a flat tuple of ints in preorder, 3 per node and 1 per
+    edge: whether the node was answered "unknown", its number of successors and the length of their encoding, followed
+    by the letter index and encoding of every successor. The words that were answered "unknown" are then not queried
+    again, while the subtree takes a fraction of the memory of its nodes.
+    """
+
+    UNKNOWN = 1
+    NOT_QUERIED = 0
+
+    def __init__(self, alphabet):
+        self.alphabet = list(alphabet)
+        self.letter_index = {letter: i for i, letter in enumerate(self.alphabet)}
+        self.subtrees = dict()
+
+    def __len__(self):
+        return len(self.subtrees)
+
+    def _trie(self, node):
+        """
+        The subtree of a node as nested lists [flag, {letter index: trie}], including the subtrees pruned below it.
+        """
+        flag = PrunedSubtrees.UNKNOWN if node.output == "unknown" else PrunedSubtrees.NOT_QUERIED
+        trie = [flag, dict()]
+        for letter, successor in node.successor_items():
+            trie[1][self.letter_index[letter]] = self._trie(successor)
+        for letter in self.alphabet:
+            packed = self.subtrees.pop((node, letter), None)
+            if packed is not None:
+                PrunedSubtrees._merge(trie[1], self.letter_index[letter], PrunedSubtrees._unpack(packed, 0)[0])
+        return trie
+
+    @staticmethod
+    def _merge(children, letter, trie):
+        if letter not in children:
+            children[letter] = trie
+            return
+        existing = children[letter]
+        existing[0] = max(existing[0], trie[0])
+        for child_letter, child in trie[1].items():
+            PrunedSubtrees._merge(existing[1], child_letter, child)
+
+    @staticmethod
+    def _pack(trie, packed):
+        flag, children = trie
+        start = len(packed)
+        packed.extend((flag, len(children), 0))
+        for letter in sorted(children):
+            packed.append(letter)
+            PrunedSubtrees._pack(children[letter], packed)
+        packed[start + 2] = len(packed) - start - 3
+
+    @staticmethod
+    def _unpack(packed, position):
+        """
+        Returns the trie encoded at the position and the position after it.
+        """
+        flag, num_children, _ = packed[position:position + 3]
+        position += 3
+        children = dict()
+        for _ in range(num_children):
+            letter = packed[position]
+            children[letter], position = PrunedSubtrees._unpack(packed, position + 1)
+        return [flag, children], position
+
+    def prune(self, parent, letter):
+        """
+        Remember the subtree of the successor of the parent for the letter, which the caller removes from the tree.
+        """
+        trie = self._trie(parent.get_successor(letter))
+        packed = self.subtrees.pop((parent, letter), None)
+        if packed is not None:
+            existing = PrunedSubtrees._unpack(packed, 0)[0]
+            holder = {0: existing}
+            PrunedSubtrees._merge(holder, 0, trie)
+            trie = holder[0]
+        packed = []
+        PrunedSubtrees._pack(trie, packed)
+        self.subtrees[(parent, letter)] = tuple(packed)
+
+    def lookup(self, parent, word):
+        """
+        Flags of the pruned nodes along the word, which starts with the letter below the parent. The list ends where
+        the word leaves the pruned subtree.
+        """
+        packed = self.subtrees.get((parent, word[0]))
+        if packed is None:
+            return []
+        flags = [packed[0]]
+        position = 0
+        for letter in word[1:]:
+            letter = self.letter_index[letter]
+            num_children = packed[position + 1]
+            position += 3
+            for _ in range(num_children):
+                if packed[position] == letter:
+                    position += 1
+                    break
+                position += 1
+                position += 3 + packed[position + 2]
+            else:
+                return flags
+            flags.append(packed[position])
+        return flags
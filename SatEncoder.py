@@ -0,0 +1,164 @@
+import time
+
+import z3
+from pysmt.exceptions import SolverReturnedUnknownResultError
+
+
+class SatEncoder:
+    """
+    One-hot Boolean encoding of the hypothesis search, solved by a plain SAT solver.
+    There are 3 kinds of variables: x(n, s) node n is in state s, t(s, a, s') the a-transition of s goes to s'
+    and o(s) state s is accepting.
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.num_vars = 0
+        self.clauses = []
+
+        size = instance.size
+        self.output_vars = [self._new_var() for _ in range(size)]
+        self.transition_vars = [[[self._new_var() for _ in range(size)] for _ in range(instance.num_letters)]
+                                for _ in range(size)]
+
+        # States each node may be in, basis nodes are pinned and frontier nodes are limited to their candidates
+        allowed = [range(size) for _ in range(len(instance))]
+        free_states = list(range(len(instance.basis), size))
+        for node, candidates in instance.candidates:
+            allowed[node] = sorted(candidates) + free_states
+        for i, node in enumerate(instance.basis):
+            allowed[node] = [i]
+        self.node_vars = [{s: self._new_var() for s in states} for states in allowed]
+
+    def _new_var(self):
+        self.num_vars += 1
+        return self.num_vars
+
+    def encode(self):
+        """
+        Generate the clauses of the instance.
+        """
+        instance = self.instance
+        size = instance.size
+        clauses = self.clauses
+
+        # Every transition has exactly one target
+        for s in range(size):
+            for a in range(instance.num_letters):
+                targets = self.transition_vars[s][a]
+                clauses.append(targets)
+                for i in range(size):
+                    for j in range(i + 1, size):
+                        clauses.append([-targets[i], -targets[j]])
+
+        # Every node is in at least one state. At most one is not needed: the transitions are deterministic, so
+        # the run of the hypothesis from the root picks exactly one of the states that are set for a node.
+        for node_vars in self.node_vars:
+            clauses.append(list(node_vars.values()))
+
+        # Follow the tree
+        for node in range(1, len(instance)):
+            parent_vars = self.node_vars[instance.parents[node]]
+            node_vars = self.node_vars[node]
+            letter = instance.letters[node]
+            for s, parent_var in parent_vars.items():
+                targets = self.transition_vars[s][letter]
+                for s2 in range(size):
+                    if s2 in node_vars:
+                        clauses.append([-parent_var, -targets[s2], node_vars[s2]])
+                    else:
+                        clauses.append([-parent_var, -targets[s2]])
+
+        # Force known outputs
+        for node, output in enumerate(instance.outputs):
+            if output is None:
+                continue
+            for s, node_var in self.node_vars[node].items():
+                clauses.append([-node_var, self.output_vars[s] if output else -self.output_vars[s]])
+
+        # Nodes that are apart are in different states
+        for i, j in instance.apart_pairs:
+            for s, node_var in self.node_vars[i].items():
+                if s in self.node_vars[j]:
+                    clauses.append([-node_var, -self.node_vars[j][s]])
+
+    def encode_symmetry_breaking(self):
+        """
+        The free states can be permuted freely, so only allow the labelling in which free state i is used by a node
+        with a lower index than free state i + 1.
+        """
+        instance = self.instance
+        clauses = self.clauses
+        free_states = range(len(instance.basis), instance.size)
+        # Variable stating that a free state is used by one of the nodes handled so far
+        seen = {state: None for state in free_states}
+        for node_vars in self.node_vars:
+            for state in free_states[1:]:
+                if state in node_vars:
+                    if seen[state - 1] is None:
+                        clauses.append([-node_vars[state]])
+                    else:
+                        clauses.append([-node_vars[state], seen[state - 1]])
+            for state in free_states:
+                if state not in node_vars:
+                    continue
+                if seen[state] is None:
+                    seen[state] = node_vars[state]
+                else:
+                    used = self._new_var()
+                    clauses.append([-node_vars[state], used])
+                    clauses.append([-seen[state], used])
+                    clauses.append([-used, seen[state], node_vars[state]])
+                    seen[state] = used
+
+    def to_dimacs(self):
+        lines = [f"p cnf {self.num_vars} {len(self.clauses)}"]
+        lines.extend(" ".join(map(str, clause)) + " 0" for clause in self.clauses)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def find_hypothesis(instance, solver_timeout, symmetry_breaking=False, random_seed=None, timings=None):
+        """
+        Find a hypothesis for the instance, using the SAT core of z3.
+        With symmetry breaking, the free states are ordered by the first node that maps to them.
+        The random seed of z3 only changes the search, not the answer.
+        When a timings dict is given, the time spent on building and loading the clauses is stored under "encode".
+        Returns the transition and output mapping, or None twice if no hypothesis of the size exists.
+        Raises SolverReturnedUnknownResultError if the solver times out.
+        """
+        start_time = time.time()
+        encoder = SatEncoder(instance)
+        encoder.encode()
+        if symmetry_breaking:
+            encoder.encode_symmetry_breaking()
+
+        # A context of its own, so learners in different threads do not share solver state
+        s = z3.SolverFor("QF_FD", ctx=z3.Context())
+        s.set("timeout", solver_timeout)
+        if random_seed is not None:
+            s.set("random_seed", random_seed)
+        s.from_string(encoder.to_dimacs())
+        if timings is not None:
+            timings["encode"] = time.time() - start_time
+        result = s.check()
+        if result == z3.unknown:
+            raise SolverReturnedUnknownResultError
+        if result == z3.unsat:
+            return None, None
+
+        # Variables are named after their DIMACS index, the solver may leave irrelevant ones out of the model
+        model = s.model()
+        true_vars = {int(str(d.name())[2:]) for d in model.decls() if z3.is_true(model[d])}
+
+        transition_mapping = [[0 for _ in range(instance.num_letters)] for _ in range(instance.size)]
+        output_mapping = [False for _ in range(instance.size)]
+
+        for i in range(instance.size):
+            output_mapping[i] = encoder.output_vars[i] in true_vars
+            for j in range(instance.num_letters):
+                for target, var in enumerate(encoder.transition_vars[i][j]):
+                    if var in true_vars:
+                        transition_mapping[i][j] = target
+                        break
+
+        return transition_mapping, output_mapping
@@ -0,0 +1,109 @@
+import time
+
+from pysmt.shortcuts import (Solver, Symbol, Function, Int, Bool, Or, Not, Implies, GE, LE, LT)
+from pysmt.typing import INT, BOOL, FunctionType
+
+
+class SmtEncoder:
+    @staticmethod
+    def find_hypothesis(instance, solver_timeout, symmetry_breaking=False, random_seed=None, timings=None,
+                        unsat_core=None):
+        """
+        Find a hypothesis for the instance, using the pySMT solver.
+        There are 2 free functions: "out" and "m" and 1 bound function "delta".
+        With symmetry breaking, the free states are ordered by the first node that maps to them.
+        The random seed of z3 only changes the search, not the answer.
+        When a timings dict is given, the time spent on building the assertions is stored under "encode".
+        When an unsat_core list is given, the candidate and output constraints are tracked and on UNSAT the nodes of
+        the tracked constraints in the unsat core are added to it.
+        Returns the transition and output mapping, or None twice if no hypothesis of the size exists.
+        Raises SolverReturnedUnknownResultError if the solver times out.
+        """
+        start_time = time.time()
+        s = Solver(name="z3", random_seed=random_seed, unsat_cores_mode="named" if unsat_core is not None else None,
+                   solver_options={"timeout": solver_timeout})  # or another backend supported by pySMT
+
+        # Function declarations
+        delta = Symbol("delta", FunctionType(INT, [INT, INT]))  # δ: int × int → int
+        dfa_output = Symbol("dfa_output", FunctionType(BOOL, [INT]))  # dfa_output: int → bool
+        states_mapping = Symbol("states_mapping", FunctionType(INT, [INT]))  # states_mapping: int → int
+
+        mapped = [Function(states_mapping, [Int(i)]) for i in range(len(instance))]
+
+        # Follow the tree
+        for i in range(1, len(instance)):
+            s.add_assertion(mapped[i].Equals(
+                Function(delta, [mapped[instance.parents[i]], Int(instance.letters[i])])))
+
+        # Basis nodes map to different states
+        for i, node in enumerate(instance.basis):
+            s.add_assertion(mapped[node].Equals(Int(i)))
+
+        # Force known outputs
+        for i, output in enumerate(instance.outputs):
+            if output is not None:
+                s.add_assertion(Function(dfa_output, [mapped[i]]).Iff(Bool(output)),
+                                named=f"output_{i}" if unsat_core is not None else None)
+
+        free_states = range(len(instance.basis), instance.size)
+        for node, candidates in instance.candidates:
+            s.add_assertion(Or([mapped[node].Equals(Int(c)) for c in candidates] +
+                               [mapped[node].Equals(Int(i)) for i in free_states]),
+                            named=f"candidates_{node}" if unsat_core is not None else None)
+
+        for i, j in instance.apart_pairs:
+            s.add_assertion(Not(mapped[i].Equals(mapped[j])))
+
+        if symmetry_breaking:
+            SmtEncoder.add_symmetry_breaking(s, instance, states_mapping, mapped)
+
+        # Correct delta
+        for i in range(instance.size):
+            for j in range(instance.num_letters):
+                d_ij = Function(delta, [Int(i), Int(j)])
+                s.add_assertion(GE(d_ij, Int(0)))
+                s.add_assertion(LT(d_ij, Int(instance.size)))
+
+        if timings is not None:
+            timings["encode"] = time.time() - start_time
+        if not s.solve():
+            if unsat_core is not None:
+                # pySMT names the untracked assertions itself
+                unsat_core.extend(int(name.split("_")[1]) for name in s.get_named_unsat_core()
+                                  if name.startswith(("output_", "candidates_")))
+            return None, None
+        model = s.get_model()
+
+        transition_mapping = [[0 for _ in range(instance.num_letters)] for _ in range(instance.size)]
+        output_mapping = [False for _ in range(instance.size)]
+
+        for i in range(instance.size):
+            val = model.get_value(Function(dfa_output, [Int(i)]))
+            output_mapping[i] = str(val) == "True"
+            for j in range(instance.num_letters):
+                val = model.get_value(Function(delta, [Int(i), Int(j)]))
+                transition_mapping[i][j] = int(str(val))
+
+        return transition_mapping, output_mapping
+
+    @staticmethod
+    def add_symmetry_breaking(s, instance, states_mapping, mapped):
+        """
+        The free states can be permuted freely, so only allow the labelling in which free state i is used by a node
+        with a lower index than free state i + 1. first_i is the lowest node index mapped to state i, or the number
+        of nodes if state i is not used.
+        """
+        unused = Int(len(instance))
+        basis = set(instance.basis)
+        free_states = range(len(instance.basis), instance.size)
+        first = {state: Symbol(f"first_{state}", INT) for state in free_states}
+        for state in free_states:
+            for i in range(len(instance)):
+                if i not in basis:
+                    s.add_assertion(Implies(mapped[i].Equals(Int(state)), LE(first[state], Int(i))))
+            s.add_assertion(Or(first[state].Equals(unused),
+                               Function(states_mapping, [first[state]]).Equals(Int(state))))
+            s.add_assertion(GE(first[state], Int(0)))
+            s.add_assertion(LE(first[state], unused))
+        for state in free_states[:-1]:
+            s.add_assertion(LE(first[state], first[state + 1]))
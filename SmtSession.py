@@ -0,0 +1,254 @@
+import logging
+import time
+from collections import deque
+
+from pysmt.exceptions import SolverReturnedUnknownResultError
+from pysmt.shortcuts import (Solver, Symbol, Function, Int, Bool, Or, And, Not, Implies, GE, LE, LT)
+from pysmt.typing import INT, BOOL, FunctionType
+
+
+class SmtSession:
+    """
+    Incremental SMT session that lives as long as the observation tree.
+    Constraints that can never become false (transitions of the tree and known outputs) are encoded once.
+    Constraints that depend on the basis, the candidate sets or the hypothesis size are guarded by assumption
+    literals, so they can be swapped out between calls without rebuilding the solver.
+
+    z3 answers quickly in incremental mode when the previous call left it close to a model, but it skips its
+    preprocessing there, which makes hard UNSAT calls much slower. The incremental check therefore gets a small
+    budget, after which the cached constraints are solved by a fresh solver.
+    """
+
+    def __init__(self, ob_tree, incremental_timeout=1000):
+        self.ob_tree = ob_tree
+        self.incremental_timeout = min(incremental_timeout, ob_tree.solver_timeout)
+        self.solver = Solver(name="z3", solver_options={"timeout": self.incremental_timeout})
+
+        # Function declarations
+        self.delta = Symbol("delta", FunctionType(INT, [INT, INT]))  # δ: int × int → int
+        self.dfa_output = Symbol("dfa_output", FunctionType(BOOL, [INT]))  # dfa_output: int → bool
+        self.states_mapping = Symbol("states_mapping", FunctionType(INT, [INT]))  # states_mapping: int → int
+
+        # Nodes get a fixed index the first time they are encoded, parents are always encoded before children
+        self.node_index = dict()
+        self.encoded_outputs = set()
+        self.assertions = []
+
+        # Guards of the retractable constraints, and the constraint each guard enables
+        self.guard_count = 0
+        self.guarded = dict()
+        self.size_guards = dict()
+        self.basis_guards = dict()
+        self.candidate_guards = dict()
+
+        # Symmetry breaking: first_i is the lowest node index mapped to state i
+        self.first = dict()
+        self.first_encoded_nodes = 0
+        self.symmetry_guard = None
+
+    def _add_assertion(self, formula):
+        self.solver.add_assertion(formula)
+        self.assertions.append(formula)
+
+    def _add_guarded(self, formula):
+        self.guard_count += 1
+        guard = Symbol(f"guard_{self.guard_count}", BOOL)
+        self.solver.add_assertion(Implies(guard, formula))
+        self.guarded[guard] = formula
+        return guard
+
+    def _retire_guard(self, guard):
+        # A guard that is never assumed again can be fixed to false, which lets the solver drop its clauses
+        self.solver.add_assertion(Not(guard))
+        del self.guarded[guard]
+
+    def _mapped_state(self, node):
+        return Function(self.states_mapping, [Int(self.node_index[node])])
+
+    def _encode_new_nodes(self):
+        """
+        Add the transition and output constraints of nodes that have not been encoded yet.
+        """
+        alphabet = self.ob_tree.alphabet
+        root = self.ob_tree.root
+        if root not in self.node_index:
+            self.node_index[root] = 0
+
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            if node not in self.encoded_outputs and self.ob_tree.is_known(node):
+                self._add_assertion(Function(self.dfa_output, [self._mapped_state(node)]).Iff(Bool(node.output)))
+                self.encoded_outputs.add(node)
+            for letter, successor in node.successor_items():
+                # Check if successor can reach a known node
+                if not successor.leads_to_known:
+                    continue
+                queue.append(successor)
+                if successor in self.node_index:
+                    continue
+                self.node_index[successor] = len(self.node_index)
+                self._add_assertion(self._mapped_state(successor).Equals(
+                    Function(self.delta, [self._mapped_state(node), Int(alphabet.index(letter))])))
+
+    def _size_guard(self, size):
+        """
+        Guard for the range of delta in a hypothesis of the given size.
+        """
+        if size not in self.size_guards:
+            bounds = []
+            for i in range(size):
+                for j in range(len(self.ob_tree.alphabet)):
+                    d_ij = Function(self.delta, [Int(i), Int(j)])
+                    bounds.append(GE(d_ij, Int(0)))
+                    bounds.append(LT(d_ij, Int(size)))
+            self.size_guards[size] = self._add_guarded(And(bounds))
+        return self.size_guards[size]
+
+    def _basis_guards(self):
+        """
+        Guards pinning the basis nodes to their state, retiring the guards of nodes that left the basis.
+        """
+        active = dict()
+        for i, node in enumerate(self.ob_tree.guaranteed_basis):
+            guard = self.basis_guards.pop((node, i), None)
+            if guard is None:
+                guard = self._add_guarded(self._mapped_state(node).Equals(Int(i)))
+            active[(node, i)] = guard
+        for guard in self.basis_guards.values():
+            self._retire_guard(guard)
+        self.basis_guards = active
+        return list(active.values())
+
+    def _candidate_guards(self):
+        """
+        Guards restricting the frontier nodes to their basis candidates or to a state outside the basis.
+        Only candidate sets that changed since the previous call, or all of them after a size change, are re-encoded.
+        """
+        basis = self.ob_tree.guaranteed_basis
+        basis_index = {node: i for i, node in enumerate(basis)}
+        free_states = tuple(range(len(basis), self.ob_tree.size))
+        active = dict()
+        candidate_sets = self.ob_tree.frontier_to_basis_dict
+        for node, mask in candidate_sets.masks():
+            if node not in self.node_index:
+                continue
+            key = (frozenset(basis_index[c] for c in candidate_sets.nodes_of(mask)), free_states)
+            previous = self.candidate_guards.pop(node, None)
+            if previous is not None and previous[0] == key:
+                active[node] = previous
+                continue
+            if previous is not None:
+                self._retire_guard(previous[1])
+            mapped = self._mapped_state(node)
+            guard = self._add_guarded(Or([mapped.Equals(Int(i)) for i in sorted(key[0]) + list(free_states)]))
+            active[node] = (key, guard)
+        for _, guard in self.candidate_guards.values():
+            self._retire_guard(guard)
+        self.candidate_guards = active
+        return [guard for _, guard in active.values()]
+
+    def _symmetry_breaking_guard(self):
+        """
+        Guard ordering the states outside the basis by the first node that maps to them.
+        The lower bounds on first_i hold for any basis and size, so they are encoded once per node and state. The
+        definition of first_i for the current number of nodes and the ordering of the free states are guarded.
+        """
+        size = self.ob_tree.size
+        num_nodes = len(self.node_index)
+        for state in range(1, size):
+            if state not in self.first:
+                self.first[state] = Symbol(f"first_{state}", INT)
+                start = 1
+            else:
+                start = self.first_encoded_nodes
+            for i in range(start, num_nodes):
+                mapped = Function(self.states_mapping, [Int(i)])
+                self._add_assertion(Implies(mapped.Equals(Int(state)), LE(self.first[state], Int(i))))
+        self.first_encoded_nodes = num_nodes
+
+        free_states = range(len(self.ob_tree.guaranteed_basis), size)
+        key = (free_states, num_nodes)
+        if self.symmetry_guard is not None and self.symmetry_guard[0] == key:
+            return self.symmetry_guard[1]
+        if self.symmetry_guard is not None:
+            self._retire_guard(self.symmetry_guard[1])
+
+        unused = Int(num_nodes)
+        frame = []
+        for state in free_states:
+            first = self.first[state]
+            frame.append(Or(first.Equals(unused), Function(self.states_mapping, [first]).Equals(Int(state))))
+            frame.append(GE(first, Int(0)))
+            frame.append(LE(first, unused))
+        for state in free_states[:-1]:
+            frame.append(LE(self.first[state], self.first[state + 1]))
+        guard = self._add_guarded(And(frame))
+        self.symmetry_guard = (key, guard)
+        return guard
+
+    def _solve(self, assumptions):
+        """
+        Solve under the assumptions, first incrementally and then from scratch on the cached constraints.
+        Returns the satisfied solver, or None if the constraints are unsatisfiable.
+        """
+        try:
+            return self.solver if self.solver.solve(assumptions) else None
+        except SolverReturnedUnknownResultError:
+            if self.incremental_timeout >= self.ob_tree.solver_timeout:
+                raise
+        logging.debug("Incremental check inconclusive, solving from scratch")
+        solver = Solver(name="z3", solver_options={"timeout": self.ob_tree.solver_timeout})
+        for formula in self.assertions:
+            solver.add_assertion(formula)
+        for guard in assumptions:
+            solver.add_assertion(self.guarded[guard])
+        return solver if solver.solve() else None
+
+    def find_hypothesis(self):
+        """
+        Find a hypothesis consistent with the observation tree, reusing the constraints of previous calls.
+        """
+        ob_tree = self.ob_tree
+        size = ob_tree.size
+        logging.debug(f"Trying to build hypothesis of size {size} (incremental)")
+        start_smt_time = time.time()
+
+        self._encode_new_nodes()
+        assumptions = [self._size_guard(size)] + self._basis_guards() + self._candidate_guards()
+        if ob_tree.symmetry_breaking:
+            assumptions.append(self._symmetry_breaking_guard())
+        ob_tree.smt_encode_time += time.time() - start_smt_time
+
+        try:
+            logging.debug("Solving...")
+            solver = self._solve(assumptions)
+            if solver is None:
+                logging.debug("UNSAT")
+                logging.debug(f"No hypothesis of size {size} exists")
+                ob_tree.smt_time += time.time() - start_smt_time
+                ob_tree.last_answer = "unsat"
+                return None, None
+            else:
+                logging.debug("SAT")
+                ob_tree.smt_time += time.time() - start_smt_time
+                ob_tree.last_answer = "sat"
+                model = solver.get_model()
+
+                transition_mapping = [[0 for _ in range(len(ob_tree.alphabet))] for _ in range(size)]
+                output_mapping = [False for _ in range(size)]
+
+                for i in range(size):
+                    val = model.get_value(Function(self.dfa_output, [Int(i)]))
+                    output_mapping[i] = str(val) == "True"
+                    for j in range(len(ob_tree.alphabet)):
+                        val = model.get_value(Function(self.delta, [Int(i), Int(j)]))
+                        transition_mapping[i][j] = int(str(val))
+
+                return transition_mapping, output_mapping
+        except SolverReturnedUnknownResultError:
+            ob_tree.smt_time += time.time() - start_smt_time
+            logging.debug("TIMEOUT")
+            logging.debug(f"Could not find hypothesis of size {size}")
+            ob_tree.last_answer = "unknown"
+            return None, None
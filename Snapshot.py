@@ -0,0 +1,347 @@
+import functools
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from CacheTree import CacheTree, Node
+from CompactTree import CompactNode
+from MooreNode import MooreNode
+
+
+class Snapshot:
+    """
+    Binary snapshot of the state of a learner: the observation tree, the basis, the basis candidates, the pruned
+    subtrees, the explored depths of the prefix expansion, the size search, the timers and query counters, and the
+    cache of the SUL. A learner is resumed by building a new ObservationTreeSquare with the same alphabet, SUL and
+    options, and loading the snapshot into it.
+    The caches of apartness and of the subtree signatures are not saved, they are filled again when needed.
+    The file is a magic header followed by sections, each a tag, its length and a payload padded to 8 bytes. The small
+    values and the options of the learner are in a JSON section, the rest are typed arrays in the byte order of the
+    machine, or a matrix of bitmasks for the candidates. The tree is stored as columns indexed by node id, for the
+    compact tree these are its own arrays. The file is memory mapped when it is loaded: the arrays of a compact tree
+    are copied from it in one go, the other sections are read through views without converting them to lists.
+    Nodes are referred to by their id, which is kept. A snapshot is only loaded by a learner with the same options.
+    """
+
+    MAGIC = b"LSQSNAP2"
+    # Outputs as codes, like the outputs of the compact tree
+    OUTPUT_VALUES = [None, True, False, "unknown"]
+    SUL_COUNTERS = ["num_queries", "num_steps", "num_cached_queries", "num_successful_queries"]
+    # Sections of a compact tree: tag, array of the tree and typecode
+    COMPACT_ARRAYS = [(b"OUTS", "outputs", "B"), (b"PARS", "parents", "i"), (b"INPS", "inputs", "i"),
+                      (b"DEPS", "depths", "i"), (b"LEAD", "leads_to_known", "B"), (b"VERS", "versions", "q"),
+                      (b"SUCC", "successors", "i"), (b"FRST", "first_child", "i"), (b"LAST", "last_child", "i"),
+                      (b"NEXT", "next_sibling", "i")]
+
+    @staticmethod
+    def output_code(output):
+        for code, value in enumerate(Snapshot.OUTPUT_VALUES):
+            if value is output or (type(value) is type(output) and value == output):
+                return code
+        raise ValueError(f"Output {output!r} cannot be stored in a snapshot")
+
+    @staticmethod
+    def save(path, ob_tree, counters=None):
+        """
+        Write a snapshot of the learner to the path, together with the counters of the learning loop. The file is
+        written next to the path first and then moved, so a crash does not leave a partial snapshot.
+        """
+        letter_index = {letter: i for i, letter in enumerate(ob_tree.alphabet)}
+        live = set()
+        stack = [ob_tree.root]
+        while stack:
+            node = stack.pop()
+            live.add(node.id)
+            stack.extend(successor for _, successor in node.successor_items())
+        root = ob_tree.root
+        if isinstance(root, CompactNode):
+            tree_sections = Snapshot._compact_tree_sections(root.tree)
+        else:
+            tree_sections = Snapshot._moore_tree_sections(root, letter_index)
+
+        candidate_sets = ob_tree.frontier_to_basis_dict
+        # The bits stay assigned to the basis nodes that left the basis, which may be pruned since
+        basis_of_bit = array("i", [node.id if node is not None and node.id in live else 0
+                                   for node in candidate_sets.basis_of_bit])
+        mask_width = (len(basis_of_bit) + 7) // 8
+        masks = bytearray(candidate_sets.basis_mask.to_bytes(mask_width, "little"))
+        for excluded in candidate_sets.excluded.values():
+            masks += excluded.to_bytes(mask_width, "little")
+
+        pruned = array("i")
+        if ob_tree.pruned_subtrees is not None:
+            for (parent, letter), packed in ob_tree.pruned_subtrees.subtrees.items():
+                pruned.extend((parent.id, letter_index[letter], len(packed)))
+                pruned.extend(packed)
+
+        # Explored depths of the prefix expansion, -1 below a dead prefix
+        explored = array("i")
+        for node, depth in ob_tree.explored_depth.items():
+            explored.extend((node.id, -1 if depth == math.inf else depth))
+
+        sul = ob_tree.sul
+        cache = getattr(sul, "cache", None)
+        last_mapping = None
+        if ob_tree.last_mapping is not None:
+            transition_mapping, output_mapping = ob_tree.last_mapping
+            last_mapping = [[[int(state) for state in row] for row in transition_mapping],
+                            [bool(output) for output in output_mapping]]
+        meta = {"byteorder": sys.byteorder, "alphabet": [repr(letter) for letter in ob_tree.alphabet],
+                "options": ob_tree.options, "id_counter": root.id_counter, "size": ob_tree.size,
+                "size_lower_bound": ob_tree.size_lower_bound, "unknown_answers": list(ob_tree.unknown_answers.items()),
+                "last_answer": ob_tree.last_answer, "last_mapping": last_mapping, "smt_time": ob_tree.smt_time,
+                "smt_encode_time": ob_tree.smt_encode_time, "mask_width": mask_width,
+                "sul_counters": {name: getattr(sul, name) for name in Snapshot.SUL_COUNTERS if hasattr(sul, name)},
+                "sul_cache": isinstance(cache, CacheTree), "counters": counters or {}}
+
+        sections = [(b"META", json.dumps(meta).encode())]
+        sections.extend(tree_sections)
+        sections.extend([(b"BASE", array("i", [node.id for node in ob_tree.guaranteed_basis]).tobytes()),
+                         (b"CAND", array("i", [node.id for node in candidate_sets.excluded]).tobytes()),
+                         (b"MASK", bytes(masks)),
+                         (b"BITS", basis_of_bit.tobytes()),
+                         (b"BBIT", array("i", [value for node, bit in candidate_sets.bits.items()
+                                               for value in (node.id, bit)]).tobytes()),
+                         (b"DIRT", array("i", [node.id for node in ob_tree.dirty_nodes]).tobytes()),
+                         (b"CORE", array("i", [node.id for node in ob_tree.core_nodes]).tobytes()),
+                         (b"PRUN", pruned.tobytes()),
+                         (b"EXPL", explored.tobytes())])
+        if isinstance(cache, CacheTree):
+            sections.append((b"SULC", Snapshot._pack_cache(cache, letter_index).tobytes()))
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(Snapshot.MAGIC)
+            for tag, payload in sections:
+                f.write(struct.pack("<4sQ", tag, len(payload)))
+                f.write(payload)
+                f.write(bytes(-len(payload) % 8))
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def _compact_tree_sections(tree):
+        """
+        The arrays of a compact tree as they are, including the rows of pruned nodes, which are no longer linked.
+        """
+        if tree.output_values != Snapshot.OUTPUT_VALUES:
+            raise ValueError(f"Output {tree.output_values[len(Snapshot.OUTPUT_VALUES)]!r} cannot be stored in a "
+                             f"snapshot")
+        return [(tag, getattr(tree, name).tobytes() if name != "leads_to_known" else bytes(tree.leads_to_known))
+                for tag, name, _ in Snapshot.COMPACT_ARRAYS]
+
+    @staticmethod
+    def _moore_tree_sections(root, letter_index):
+        """
+        Columns indexed by node id: the output code, the parent id, the letter index, the leads to known flag and the
+        version. Ids that are not in the tree have parent -1, like the root.
+        """
+        size = root.id_counter + 1
+        outputs = bytearray(size)
+        parents = array("i", [-1]) * size
+        inputs = array("i", [-1]) * size
+        leads_to_known = bytearray(size)
+        versions = array("q", [0]) * size
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            outputs[node.id] = Snapshot.output_code(node.output)
+            leads_to_known[node.id] = node.leads_to_known
+            versions[node.id] = node.version
+            for letter, successor in node.successor_items():
+                parents[successor.id] = node.id
+                inputs[successor.id] = letter_index[letter]
+                stack.append(successor)
+        return [(b"OUTS", bytes(outputs)), (b"PARS", parents.tobytes()), (b"INPS", inputs.tobytes()),
+                (b"LEAD", bytes(leads_to_known)), (b"VERS", versions.tobytes())]
+
+    @staticmethod
+    def _pack_cache(cache, letter_index):
+        """
+        The cache tree in preorder: per node its output code and number of children, then per child its letter index
+        and its encoding.
+        """
+        packed = array("i")
+        stack = [(None, cache.root_node)]
+        while stack:
+            letter, node = stack.pop()
+            if letter is not None:
+                if letter not in letter_index:
+                    raise ValueError(f"Letter {letter!r} of the SUL cache is not in the alphabet")
+                packed.append(letter_index[letter])
+            packed.extend((Snapshot.output_code(node.value), len(node.children)))
+            stack.extend(reversed(node.children.items()))
+        return packed
+
+    @staticmethod
+    def _unpack_cache(packed, alphabet):
+        cache = CacheTree()
+        cache.root_node.value = Snapshot.OUTPUT_VALUES[packed[0]]
+        # Nodes whose children are still being read, with the number of children left
+        stack = [[cache.root_node, packed[1]]]
+        position = 2
+        while stack:
+            if stack[-1][1] == 0:
+                stack.pop()
+                continue
+            stack[-1][1] -= 1
+            child = Node(Snapshot.OUTPUT_VALUES[packed[position + 1]])
+            stack[-1][0].children[alphabet[packed[position]]] = child
+            stack.append([child, packed[position + 2]])
+            position += 3
+        return cache
+
+    @staticmethod
+    def _read_sections(data):
+        if data[:len(Snapshot.MAGIC)] != Snapshot.MAGIC:
+            raise ValueError("Not a snapshot of the learner")
+        sections = dict()
+        position = len(Snapshot.MAGIC)
+        while position < len(data):
+            tag, length = struct.unpack_from("<4sQ", data, position)
+            position += struct.calcsize("<4sQ")
+            sections[tag] = data[position:position + length]
+            position += length + (-length % 8)
+        return sections
+
+    @staticmethod
+    def load(path, ob_tree):
+        """
+        Load a snapshot into a new observation tree, built with the same alphabet, SUL and options as the saved one.
+        Returns the counters of the learning loop that were saved with it.
+        """
+        if ob_tree.root.successors:
+            raise ValueError("A snapshot can only be loaded into a new observation tree")
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Every view on the mapped file has to be released before it is closed
+            views = [memoryview(data)]
+            try:
+                sections = Snapshot._read_sections(views[0])
+                views.extend(sections.values())
+                meta = json.loads(bytes(sections[b"META"]))
+                Snapshot._check_meta(meta, ob_tree)
+                typecodes = {tag: typecode for tag, _, typecode in Snapshot.COMPACT_ARRAYS}
+                arrays = {tag: section.cast(typecodes.get(tag, "i")) for tag, section in sections.items()
+                          if tag not in (b"META", b"MASK")}
+                views.extend(arrays.values())
+                Snapshot._load_state(ob_tree, meta, sections, arrays)
+            finally:
+                for view in reversed(views):
+                    view.release()
+        return meta["counters"]
+
+    @staticmethod
+    def _check_meta(meta, ob_tree):
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError("The snapshot was written on a machine with another byte order")
+        if meta["alphabet"] != [repr(letter) for letter in ob_tree.alphabet]:
+            raise ValueError("The snapshot was written for another alphabet")
+        if meta["options"] != ob_tree.options:
+            different = sorted(name for name in set(meta["options"]) | set(ob_tree.options)
+                               if meta["options"].get(name) != ob_tree.options.get(name))
+            raise ValueError(f"The snapshot was written with other options: {', '.join(different)}")
+
+    @staticmethod
+    def _load_state(ob_tree, meta, sections, arrays):
+        """
+        Restore the learner from the sections of a snapshot, which are views on the mapped file, as bytes and as typed
+        arrays.
+        """
+        node = Snapshot._restore_tree(ob_tree, sections, arrays, meta["id_counter"])
+
+        ob_tree.guaranteed_basis = [node(node_id) for node_id in arrays[b"BASE"]]
+        ob_tree.basis_nodes = set(ob_tree.guaranteed_basis)
+        candidate_sets = ob_tree.frontier_to_basis_dict
+        candidate_sets.basis_of_bit = [node(node_id) if node_id else None for node_id in arrays[b"BITS"]]
+        bits = arrays[b"BBIT"]
+        candidate_sets.bits = {node(bits[i]): bits[i + 1] for i in range(0, len(bits), 2)}
+        width = meta["mask_width"]
+        masks = sections[b"MASK"]
+        candidate_sets.basis_mask = int.from_bytes(masks[:width], "little")
+        candidate_sets.excluded = {node(node_id): int.from_bytes(masks[width * i:width * (i + 1)], "little")
+                                   for i, node_id in enumerate(arrays[b"CAND"], start=1)}
+        candidate_sets.index_holders()
+        # The heaps of the promotion index are rebuilt from the candidates, in the order of the nodes
+        ob_tree.reset_candidate_index()
+        for candidate in candidate_sets:
+            ob_tree.index_candidates(candidate)
+        ob_tree.dirty_nodes = {node(node_id) for node_id in arrays[b"DIRT"]}
+        ob_tree.core_nodes = [node(node_id) for node_id in arrays[b"CORE"]]
+
+        pruned = arrays[b"PRUN"]
+        position = 0
+        while position < len(pruned):
+            parent, letter, length = pruned[position:position + 3]
+            ob_tree.pruned_subtrees.subtrees[(node(parent), ob_tree.alphabet[letter])] = \
+                tuple(pruned[position + 3:position + 3 + length])
+            position += 3 + length
+        explored = arrays[b"EXPL"]
+        ob_tree.explored_depth = {node(explored[i]): math.inf if explored[i + 1] < 0 else explored[i + 1]
+                                  for i in range(0, len(explored), 2)}
+
+        ob_tree.size = meta["size"]
+        ob_tree.size_lower_bound = meta["size_lower_bound"]
+        ob_tree.unknown_answers = dict(meta["unknown_answers"])
+        ob_tree.last_answer = meta["last_answer"]
+        if meta["last_mapping"] is not None:
+            ob_tree.last_mapping = tuple(meta["last_mapping"])
+        ob_tree.smt_time = meta["smt_time"]
+        ob_tree.smt_encode_time = meta["smt_encode_time"]
+
+        sul = ob_tree.sul
+        for name, value in meta["sul_counters"].items():
+            setattr(sul, name, value)
+        if meta["sul_cache"]:
+            sul.cache = Snapshot._unpack_cache(arrays[b"SULC"], ob_tree.alphabet)
+
+    @staticmethod
+    def _restore_tree(ob_tree, sections, arrays, id_counter):
+        """
+        Restore the saved nodes below the root of the observation tree, with their ids. Returns a function that gives
+        the node of an id.
+        """
+        root = ob_tree.root
+        if isinstance(root, CompactNode):
+            # The arrays of the compact tree are copied from the file as they are
+            tree = root.tree
+            for tag, name, typecode in Snapshot.COMPACT_ARRAYS:
+                if name == "leads_to_known":
+                    tree.leads_to_known = bytearray(sections[tag])
+                else:
+                    values = array(typecode)
+                    values.frombytes(sections[tag])
+                    setattr(tree, name, values)
+            if ob_tree.array_tree is not None:
+                stack = [root]
+                while stack:
+                    node = stack.pop()
+                    ob_tree.array_tree.mark_stale(node)
+                    stack.extend(successor for _, successor in node.successor_items())
+            return functools.partial(CompactNode, tree)
+
+        # A node is in the tree if its parent is, parents have lower ids than their successors
+        outputs, parents, inputs = arrays[b"OUTS"], arrays[b"PARS"], arrays[b"INPS"]
+        leads_to_known, versions = arrays[b"LEAD"], arrays[b"VERS"]
+        alphabet = ob_tree.alphabet
+        nodes = {root.id: root}
+        root.restore(Snapshot.OUTPUT_VALUES[outputs[root.id]], bool(leads_to_known[root.id]), versions[root.id])
+        for node_id in range(root.id + 1, len(parents)):
+            parent = nodes.get(parents[node_id])
+            if parent is None:
+                continue
+            node = MooreNode(parent)
+            node.id = node_id
+            letter = alphabet[inputs[node_id]]
+            node.input_to_parent = letter
+            node.access_sequence = parent.access_sequence + [letter]
+            node.restore(Snapshot.OUTPUT_VALUES[outputs[node_id]], bool(leads_to_known[node_id]), versions[node_id])
+            parent.successors[letter] = node
+            nodes[node_id] = node
+        if ob_tree.array_tree is not None:
+            for node in nodes.values():
+                ob_tree.array_tree.mark_stale(node)
+        root.counter[0] = id_counter
+        return nodes.__getitem__
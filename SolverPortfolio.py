@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+from pysmt.exceptions import SolverReturnedUnknownResultError
+
+from SatEncoder import SatEncoder
+from SmtEncoder import SmtEncoder
+from Z3Encoder import Z3Encoder
+
+ENCODERS = {"smt": SmtEncoder, "sat": SatEncoder, "z3": Z3Encoder}
+
+
+def _solve_configuration(index, encoding, options, instance, solver_timeout, results):
+    """
+    Entry point of a portfolio process. Puts the index of the configuration, the answer ("sat", "unsat", "unknown"
+    or "error") and the transition and output mapping on the results queue.
+    """
+    try:
+        transition_mapping, output_mapping = ENCODERS[encoding].find_hypothesis(instance, solver_timeout, **options)
+        answer = "unsat" if transition_mapping is None else "sat"
+        results.put((index, answer, (transition_mapping, output_mapping)))
+    except SolverReturnedUnknownResultError:
+        results.put((index, "unknown", (None, None)))
+    except Exception as e:
+        # A crashing configuration should not stop the others
+        logging.error(f"Portfolio configuration {encoding} {options} failed: {e!r}")
+        results.put((index, "error", (None, None)))
+
+
+class SolverPortfolio:
+    """
+    Solves a hypothesis instance with several differently configured solvers at the same time, each in its own
+    process. The first SAT or UNSAT answer is used and the remaining processes are terminated.
+    Meant for single runs on an otherwise idle machine, the benchmark scripts already use all cores.
+    """
+
+    # Encoding and keyword arguments of the encoder, in the order in which configurations are added
+    CONFIGURATIONS = [("sat", {}),
+                      ("smt", {"symmetry_breaking": True}),
+                      ("sat", {"symmetry_breaking": True}),
+                      ("smt", {}),
+                      ("sat", {"random_seed": 1}),
+                      ("smt", {"symmetry_breaking": True, "random_seed": 1}),
+                      ("sat", {"random_seed": 2}),
+                      ("smt", {"symmetry_breaking": True, "random_seed": 2})]
+
+    def __init__(self, num_processes, configurations=None):
+        if configurations is None:
+            configurations = SolverPortfolio.CONFIGURATIONS
+        if not 1 <= num_processes <= len(configurations):
+            raise ValueError(f"The portfolio needs between 1 and {len(configurations)} processes")
+        self.configurations = configurations[:num_processes]
+        if num_processes > (os.cpu_count() or 1):
+            logging.warning(f"Portfolio of {num_processes} processes on {os.cpu_count()} cores, "
+                            f"the solvers will compete for time")
+        self.context = multiprocessing.get_context()
+
+    def find_hypothesis(self, instance, solver_timeout):
+        """
+        Find a hypothesis for the instance, using all configurations of the portfolio.
+        Returns the transition and output mapping, or None twice if no hypothesis of the size exists.
+        Raises SolverReturnedUnknownResultError if no configuration gives an answer.
+        """
+        results = self.context.Queue()
+        processes = [self.context.Process(target=_solve_configuration,
+                                          args=(i, encoding, options, instance, solver_timeout, results), daemon=True)
+                     for i, (encoding, options) in enumerate(self.configurations)]
+        for process in processes:
+            process.start()
+
+        # Every configuration stops at the solver timeout, the margin covers starting the process and encoding
+        deadline = time.time() + 2 * solver_timeout / 1000 + 10
+        try:
+            pending = len(processes)
+            while pending > 0 and time.time() < deadline:
+                try:
+                    index, answer, mappings = results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes) and results.empty():
+                        break
+                    continue
+                pending -= 1
+                if answer in ["sat", "unsat"]:
+                    encoding, options = self.configurations[index]
+                    logging.debug(f"Portfolio answer {answer.upper()} from {encoding} {options}")
+                    return mappings
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            # Terminated processes may hold the queue, so do not wait for its buffer to be flushed
+            results.cancel_join_thread()
+            results.close()
+        raise SolverReturnedUnknownResultError
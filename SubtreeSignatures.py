@@ -0,0 +1,104 @@
+class SubtreeSignatures:
+    """
+    Hash-consing of the subtrees of the observation tree. Every distinct subtree gets a signature id, made of its
+    known output and the ids of its successors per letter, so structurally identical subtrees share one id. Only the
+    known outputs and the successors that lead to a known output are part of a subtree, as the rest cannot show
+    apartness.
+    The signature of a node is stored with the version of the node and recomputed once its subtree has new known
+    outputs. Apartness is computed on pairs of signatures and kept for good, as a signature never changes: nodes with
+    the same signature are never apart, and identical pairs of subtrees elsewhere in the tree are not walked again.
+    """
+
+    def __init__(self, alphabet):
+        self.letter_index = {letter: i for i, letter in enumerate(alphabet)}
+        self.ids = dict()
+        # Known output (or None) and successor signatures by letter index, per signature id
+        self.outputs = []
+        self.children = []
+        self.node_signatures = dict()
+        self.apart_pairs = dict()
+
+    def _intern(self, output, children):
+        key = (output, tuple(sorted(children.items())))
+        signature = self.ids.get(key)
+        if signature is None:
+            signature = len(self.outputs)
+            self.ids[key] = signature
+            self.outputs.append(output)
+            self.children.append(children)
+        return signature
+
+    def _is_current(self, node):
+        cached = self.node_signatures.get(node)
+        return cached is not None and cached[0] == node.version
+
+    def signature(self, node):
+        """
+        The signature id of the subtree of a node, recomputing the outdated signatures in its subtree bottom-up.
+        """
+        if not self._is_current(node):
+            stack = [(node, False)]
+            while stack:
+                current, expanded = stack.pop()
+                if not expanded:
+                    stack.append((current, True))
+                    stack.extend((successor, False) for _, successor in current.successor_items()
+                                 if successor.leads_to_known and not self._is_current(successor))
+                    continue
+                output = current.output if current.output is True or current.output is False else None
+                children = {self.letter_index[letter]: self.node_signatures[successor][1]
+                            for letter, successor in current.successor_items() if successor.leads_to_known}
+                self.node_signatures[current] = (current.version, self._intern(output, children))
+        return self.node_signatures[node][1]
+
+    def apart(self, first, second):
+        """
+        Check if two nodes are apart, by comparing the signatures of their subtrees.
+        """
+        if not first.leads_to_known or not second.leads_to_known:
+            return False
+        return self.signatures_apart(self.signature(first), self.signature(second))
+
+    def signatures_apart(self, first, second):
+        """
+        Check if two subtrees are apart: some sequence leads to different known outputs in both. The pairs of
+        subtrees are checked depth first and the results of all pairs are kept.
+        """
+        if first == second:
+            return False
+        outputs, children, apart_pairs = self.outputs, self.children, self.apart_pairs
+        root_pair = (first, second) if first < second else (second, first)
+        stack = [root_pair]
+        while stack:
+            pair = stack[-1]
+            if pair in apart_pairs:
+                stack.pop()
+                continue
+            first, second = pair
+            apart = outputs[first] is not None and outputs[second] is not None and outputs[first] != outputs[second]
+            pending = []
+            if not apart:
+                second_children = children[second]
+                for letter, first_child in children[first].items():
+                    second_child = second_children.get(letter)
+                    if second_child is None or second_child == first_child:
+                        continue
+                    child_pair = (first_child, second_child) if first_child < second_child else \
+                        (second_child, first_child)
+                    child_apart = apart_pairs.get(child_pair)
+                    if child_apart is None:
+                        # Look one level ahead, so a difference close to the pair is found before going deep
+                        first_output, second_output = outputs[first_child], outputs[second_child]
+                        child_apart = (first_output is not None and second_output is not None and
+                                       first_output != second_output) or None
+                    if child_apart:
+                        apart = True
+                        break
+                    if child_apart is None:
+                        pending.append(child_pair)
+            if apart or not pending:
+                apart_pairs[pair] = apart
+                stack.pop()
+            else:
+                stack.extend(reversed(pending))
+        return apart_pairs[root_pair]
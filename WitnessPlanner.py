@@ -0,0 +1,43 @@
+import itertools
+
+from Apartness import Apartness
+
+
+class WitnessPlanner:
+    """
+    Orders the witnesses of a frontier node by the expected number of basis candidates they rule out per input symbol
+    sent to the SUL. A witness is a distinguishing sequence of the candidates, the candidates with the other known
+    output at its end are ruled out by the answer. An "unknown" answer rules out nothing, its chance is estimated from
+    the outputs the candidates already have at the end of the witness.
+    """
+
+    # Witnesses that are ranked, the rest follow in BFS order
+    MAX_WITNESSES = 32
+
+    @staticmethod
+    def score(candidates, witness, query_length):
+        outputs = [node.output for node in (Apartness.get_successors(candidate, witness) for candidate in candidates)
+                   if node is not None]
+        accepting = sum(1 for output in outputs if output is True)
+        rejecting = sum(1 for output in outputs if output is False)
+        if accepting == 0 or rejecting == 0:
+            return 0
+        # Expected number of candidates ruled out if the answer is accepting or rejecting, in proportion to the
+        # candidates with that output
+        ruled_out = 2 * accepting * rejecting / (accepting + rejecting)
+        unknown_chance = (outputs.count("unknown") + 1) / (len(outputs) + 2)
+        return ruled_out * (1 - unknown_chance) / query_length
+
+    @staticmethod
+    def rank(ob_tree, frontier_node, witnesses):
+        """
+        Yields the first MAX_WITNESSES witnesses best first, followed by the others.
+        """
+        candidates = ob_tree.frontier_to_basis_dict[frontier_node]
+        access_length = len(ob_tree.get_access_sequence(frontier_node))
+        witnesses = iter(witnesses)
+        batch = list(itertools.islice(witnesses, WitnessPlanner.MAX_WITNESSES))
+        # The sort is stable, so equal scores keep the BFS order
+        batch.sort(key=lambda witness: -WitnessPlanner.score(candidates, witness, access_length + len(witness)))
+        yield from batch
+        yield from witnesses
@@ -0,0 +1,202 @@
+import time
+
+import z3
+from pysmt.exceptions import SolverReturnedUnknownResultError
+
+
+class Z3Encoder:
+    """
+    The encoding of SmtEncoder, handed to z3 directly instead of through pySMT.
+    Building terms through the Python API of z3 costs a foreign call and reference counting per term, which is slower
+    than pySMT. The assertions are therefore written as SMT-LIB text, in which the mapped state of every node is
+    formatted once, and parsed by z3 in a single call. The interpretations of delta and dfa_output are read from the
+    model in one pass.
+    Every encoder has its own z3 context, so learners in different threads do not share solver state.
+    """
+
+    def __init__(self, instance, simple=False):
+        self.instance = instance
+        self.context = z3.Context()
+        # The default z3 solver rejects initial values, only its plain SMT core accepts them
+        self.solver = z3.SimpleSolver(ctx=self.context) if simple else z3.Solver(ctx=self.context)
+
+        # Function declarations, z3 identifies them by name and signature so they match the parsed ones
+        int_sort = z3.IntSort(self.context)
+        self.delta = z3.Function("delta", int_sort, int_sort, int_sort)
+        self.dfa_output = z3.Function("dfa_output", int_sort, z3.BoolSort(self.context))
+
+        self.lines = ["(declare-fun delta (Int Int) Int)",
+                      "(declare-fun dfa_output (Int) Bool)",
+                      "(declare-fun states_mapping (Int) Int)"]
+        self.mapped = [f"(states_mapping {i})" for i in range(len(instance))]
+        # Selector of the candidate and output constraints of every tracked node, assumed when solving
+        self.selectors = dict()
+
+    def _assert(self, formula, node=None):
+        """
+        Add an assertion, implied by the selector of the node when it is tracked.
+        """
+        if node is None:
+            self.lines.append(f"(assert {formula})")
+            return
+        if node not in self.selectors:
+            self.selectors[node] = f"track_{node}"
+            self.lines.append(f"(declare-const track_{node} Bool)")
+        self.lines.append(f"(assert (=> track_{node} {formula}))")
+
+    def encode(self, symmetry_breaking=False, track=False):
+        """
+        Generate the assertions of the instance and add them to the solver.
+        With track, the candidate and output constraints can be part of an unsat core.
+        """
+        instance = self.instance
+        mapped = self.mapped
+        lines = self.lines
+
+        # Follow the tree
+        for i in range(1, len(instance)):
+            lines.append(f"(assert (= {mapped[i]} (delta {mapped[instance.parents[i]]} {instance.letters[i]})))")
+
+        # Basis nodes map to different states
+        for i, node in enumerate(instance.basis):
+            lines.append(f"(assert (= {mapped[node]} {i}))")
+
+        # Force known outputs
+        for i, output in enumerate(instance.outputs):
+            if output is not None:
+                self._assert(f"(= (dfa_output {mapped[i]}) {'true' if output else 'false'})", i if track else None)
+
+        free_states = range(len(instance.basis), instance.size)
+        for node, candidates in instance.candidates:
+            options = " ".join(f"(= {mapped[node]} {state})" for state in list(candidates) + list(free_states))
+            # SMT-LIB has no empty or, a node without candidates and free states has no state at all
+            self._assert(f"(or {options})" if options else "false", node if track else None)
+
+        for i, j in instance.apart_pairs:
+            lines.append(f"(assert (not (= {mapped[i]} {mapped[j]})))")
+
+        if symmetry_breaking:
+            self.encode_symmetry_breaking()
+
+        # Correct delta
+        for i in range(instance.size):
+            for j in range(instance.num_letters):
+                lines.append(f"(assert (>= (delta {i} {j}) 0))")
+                lines.append(f"(assert (< (delta {i} {j}) {instance.size}))")
+
+        self.solver.from_string("\n".join(lines))
+
+    def encode_symmetry_breaking(self):
+        """
+        Order the free states by the lowest node index mapped to them, as in SmtEncoder.add_symmetry_breaking.
+        """
+        instance = self.instance
+        unused = len(instance)
+        basis = set(instance.basis)
+        free_states = range(len(instance.basis), instance.size)
+        for state in free_states:
+            first = f"first_{state}"
+            self.lines.append(f"(declare-fun {first} () Int)")
+            for i in range(len(instance)):
+                if i not in basis:
+                    self.lines.append(f"(assert (=> (= {self.mapped[i]} {state}) (<= {first} {i})))")
+            self.lines.append(f"(assert (or (= {first} {unused}) (= (states_mapping {first}) {state})))")
+            self.lines.append(f"(assert (>= {first} 0))")
+            self.lines.append(f"(assert (<= {first} {unused}))")
+        for state in free_states[:-1]:
+            self.lines.append(f"(assert (<= first_{state} first_{state + 1}))")
+
+    def set_initial_values(self, hint):
+        """
+        Start the search of the solver from the hinted hypothesis, restricted to the states of the instance.
+        The encoder has to be built with simple.
+        """
+        instance = self.instance
+        transition_mapping, output_mapping = hint
+        for i in range(min(len(transition_mapping), instance.size)):
+            self.solver.set_initial_value(self.dfa_output(i), bool(output_mapping[i]))
+            for j, target in enumerate(transition_mapping[i]):
+                if target < instance.size:
+                    self.solver.set_initial_value(self.delta(i, j), int(target))
+
+    @staticmethod
+    def _interpretation(model, function, arity):
+        """
+        Read the entries of a function interpretation as a dict from argument tuples to Python values, together with
+        the else value. Values that are not constants are left out, so they can be evaluated one by one.
+        """
+        # A function that is in no assertion has no interpretation, z3 then returns an empty one
+        if function not in model:
+            return dict(), None
+        interpretation = model[function]
+
+        def value(term):
+            if z3.is_int_value(term):
+                return term.as_long()
+            if z3.is_true(term) or z3.is_false(term):
+                return z3.is_true(term)
+            return None
+
+        entries = dict()
+        for entry in interpretation.as_list()[:-1]:
+            arguments = tuple(value(argument) for argument in entry[:arity])
+            if None not in arguments and value(entry[arity]) is not None:
+                entries[arguments] = value(entry[arity])
+        return entries, value(interpretation.else_value())
+
+    def solve(self, solver_timeout, random_seed=None, unsat_core=None):
+        """
+        Returns the transition and output mapping, or None twice if no hypothesis of the size exists.
+        On UNSAT, the tracked nodes in the unsat core are added to the unsat_core list if it is given.
+        Raises SolverReturnedUnknownResultError if the solver times out.
+        """
+        instance = self.instance
+        self.solver.set("timeout", solver_timeout)
+        if random_seed is not None:
+            self.solver.set("random_seed", random_seed)
+        result = self.solver.check([z3.Bool(selector, self.context) for selector in self.selectors.values()])
+        if result == z3.unknown:
+            raise SolverReturnedUnknownResultError
+        if result == z3.unsat:
+            if unsat_core is not None:
+                unsat_core.extend(int(str(selector).split("_")[1]) for selector in self.solver.unsat_core())
+            return None, None
+        model = self.solver.model()
+
+        transitions, transition_default = Z3Encoder._interpretation(model, self.delta, 2)
+        outputs, output_default = Z3Encoder._interpretation(model, self.dfa_output, 1)
+
+        transition_mapping = [[0 for _ in range(instance.num_letters)] for _ in range(instance.size)]
+        output_mapping = [False for _ in range(instance.size)]
+
+        for i in range(instance.size):
+            output = outputs.get((i,), output_default)
+            if output is None:
+                output = z3.is_true(model.eval(self.dfa_output(i), model_completion=True))
+            output_mapping[i] = output
+            for j in range(instance.num_letters):
+                target = transitions.get((i, j), transition_default)
+                if target is None:
+                    target = model.eval(self.delta(i, j), model_completion=True).as_long()
+                transition_mapping[i][j] = target
+
+        return transition_mapping, output_mapping
+
+    @staticmethod
+    def find_hypothesis(instance, solver_timeout, symmetry_breaking=False, hint=None, random_seed=None, timings=None,
+                        unsat_core=None):
+        """
+        Find a hypothesis for the instance, using z3 directly.
+        A hint (transition and output mapping of an earlier hypothesis) is used as initial value of delta and out.
+        When a timings dict is given, the time spent on building and parsing the assertions is stored under "encode".
+        When an unsat_core list is given, the candidate and output constraints are tracked and on UNSAT the nodes of
+        the tracked constraints in the unsat core are added to it.
+        """
+        start_time = time.time()
+        encoder = Z3Encoder(instance, hint is not None)
+        encoder.encode(symmetry_breaking, unsat_core is not None)
+        if hint is not None:
+            encoder.set_initial_values(hint)
+        if timings is not None:
+            timings["encode"] = time.time() - start_time
+        return encoder.solve(solver_timeout, random_seed, unsat_core)
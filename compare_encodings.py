@@ -0,0 +1,48 @@
+import argparse
+import os
+
+import pandas as pd
+
+RESULTS_PATH = "benchmarking/results"
+SIZES = [f"s{size:02d}" for size in range(4, 24)]
+
+
+def load_results(extension):
+    frames = []
+    for folder in SIZES:
+        path = os.path.join(RESULTS_PATH, f"benchmark{extension}_{folder}.csv")
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path)
+        df["folder"] = folder
+        frames.append(df)
+    if not frames:
+        raise SystemExit(f"No results found for extension `{extension}`")
+    return pd.concat(frames, ignore_index=True)
+
+
+def summarize(df):
+    df["succeeded"] = df["succeeded"].astype(str).str.strip().str.lower() == "true"
+    grouped = df.groupby("folder", sort=True)
+    return pd.DataFrame({"benchmarks": grouped.size(), "succeeded": grouped["succeeded"].sum(),
+                         "median_smt_time": grouped["smt_time"].median(),
+                         "median_total_time": grouped["total_time"].median()})
+
+
+def main():
+    p = argparse.ArgumentParser(description="Compare the smt and sat encodings on the s04-s23 benchmarks")
+    p.add_argument("-t", "--timeout", type=int, default=200, help="Solver timeout used for the runs (default: 200)")
+    p.add_argument("-r", "--replace-basis", action="store_true", dest="replace_basis")
+    p.add_argument("-c", "--compatibility", action="store_true", dest="use_compatibility")
+    args = p.parse_args()
+
+    extension = f"_t{args.timeout}_r{args.replace_basis}_c{args.use_compatibility}"
+    smt = summarize(load_results(extension))
+    sat = summarize(load_results(extension + "_encodingsat"))
+    res = smt.join(sat, lsuffix="_smt", rsuffix="_sat", how="outer")
+    res["smt_speedup"] = res["median_smt_time_smt"] / res["median_smt_time_sat"]
+    print(res.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
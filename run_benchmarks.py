@@ -1,5 +1,6 @@
 import argparse
 import concurrent.futures
+import inspect
 import logging
 import os
 import random
@@ -63,29 +64,33 @@ def parse_file(filename: str, alphabet: list, horizon: int | None = None) -> tup
         return known_words, observed_alphabet
 
 
-def run_test_case(filename: str, solver_timeout, replace_basis, use_compatibility, horizon: int | None = None) -> dict[
-    str, Any]:
+def run_test_case(filename: str, solver_timeout, replace_basis, use_compatibility, horizon: int | None = None,
+                  learner_options: dict | None = None) -> dict[str, Any]:
     alphabet = [True, False]
     data, alphabet = parse_file(filename, alphabet, horizon)
     sul = IncompleteDfaSUL(data.copy())
     eq_oracle = ValidityDataOracle(data.copy())
 
     learned_dfa, info = run_lsharp_square(alphabet, sul, eq_oracle, return_data=True, solver_timeout=solver_timeout,
-                                          replace_basis=replace_basis, use_compatibility=use_compatibility)
+                                          replace_basis=replace_basis, use_compatibility=use_compatibility,
+                                          **(learner_options or {}))
 
     successful = learned_dfa is not None and eq_oracle.find_cex(learned_dfa) is None
     info["successful"] = successful
     return info
 
 
-def process_file(file_name: str, target_folder: str, solver_timeout, replace_basis, use_compatibility) -> str:
+def process_file(file_name: str, target_folder: str, solver_timeout, replace_basis, use_compatibility,
+                 learner_options: dict | None = None) -> str:
     logging.info(f"Testing {file_name}")
-    info = run_test_case(f"{target_folder}/{file_name}", solver_timeout, replace_basis, use_compatibility)
+    info = run_test_case(f"{target_folder}/{file_name}", solver_timeout, replace_basis, use_compatibility,
+                         learner_options=learner_options)
     row = ','.join([f"{target_folder}/{file_name}", str(info['successful']), str(info['learning_rounds']),
                     str(info['automaton_size']), str(info['learning_time']), str(info['smt_time']),
-                    str(info['eq_oracle_time']), str(info['total_time']), str(info['queries_learning']),
-                    str(info['validity_query']), str(info['nodes']), str(info['informative_nodes']),
-                    str(info['sul_steps']), str(info['queries_eq_oracle']), str(info['steps_eq_oracle'])]) + "\n"
+                    str(info['smt_encode_time']), str(info['eq_oracle_time']), str(info['total_time']),
+                    str(info['queries_learning']), str(info['validity_query']), str(info['nodes']),
+                    str(info['informative_nodes']), str(info['sul_steps']), str(info['queries_eq_oracle']),
+                    str(info['steps_eq_oracle'])]) + "\n"
     # logging.info(f"Finished testing {file_name}")
     # logging.info(f"Time: {info['total_time']}")
     # logging.info(f"Queries: {info['queries_learning']}")
@@ -94,10 +99,11 @@ def process_file(file_name: str, target_folder: str, solver_timeout, replace_bas
     return row
 
 
-def run_test_cases_pool(file: str, extension: str, solver_timeout, replace_basis, use_compatibility) -> None:
+def run_test_cases_pool(file: str, extension: str, solver_timeout, replace_basis, use_compatibility,
+                        learner_options: dict | None = None) -> None:
     with open(f"benchmarking/results/benchmark{extension}_{file}.csv", "w") as f:
         f.write("file name,succeeded,learning_rounds,automaton_size,learning_time,"
-                "smt_time,eq_oracle_time,total_time,queries_learning,validity_query,nodes,"
+                "smt_time,smt_encode_time,eq_oracle_time,total_time,queries_learning,validity_query,nodes,"
                 "informative_nodes,sul_steps,queries_eq_oracle,steps_eq_oracle\n")
         oliveira = test_cases_path
         target_folder = file
@@ -108,7 +114,8 @@ def run_test_cases_pool(file: str, extension: str, solver_timeout, replace_basis
         with concurrent.futures.ProcessPoolExecutor() as executor:
             results = list(executor.map(process_file, file_names, [target_folder] * len(file_names),
                                         [solver_timeout] * len(file_names), [replace_basis] * len(file_names),
-                                        [use_compatibility] * len(file_names)))
+                                        [use_compatibility] * len(file_names),
+                                        [learner_options] * len(file_names)))
             for row in results:
                 f.write(row)
 
@@ -116,7 +123,7 @@ def run_test_cases_pool(file: str, extension: str, solver_timeout, replace_basis
 
 
 def run_mealy_benchmarks(file: str, solver_timeout, replace_basis, use_compatibility, number_missing,
-                         dfa_oracle) -> None:
+                         dfa_oracle, learner_options: dict | None = None) -> None:
     mealy = aalpy.load_automaton_from_file(file, automaton_type="mealy")
     triples = []
     for state1 in mealy.states:
@@ -133,17 +140,35 @@ def run_mealy_benchmarks(file: str, solver_timeout, replace_basis, use_compatibi
     alphabet = list(set(input_alphabet + list(output_alphabet)))
     oracle = MealyDfaOracle(sul.automaton, missing)
     learned_mealy, info = run_lsharp_square(alphabet, sul, oracle, return_data=True, solver_timeout=solver_timeout,
-                                            replace_basis=replace_basis, use_compatibility=use_compatibility)
+                                            replace_basis=replace_basis, use_compatibility=use_compatibility,
+                                            **(learner_options or {}))
     cex = dfa_oracle.find_cex(learned_mealy)
     successful = learned_mealy is not None and cex is None
     print(f"{len(missing)}," + ",".join([str(info[k]) for k, v in info.items()]) + f",{successful}")
 
 
+def options_extension(learner_options: dict | None) -> str:
+    """
+    File name extension listing the learner options that differ from their default
+    """
+    defaults = inspect.signature(run_lsharp_square).parameters
+    return "".join(f"_{key}{value}" for key, value in (learner_options or {}).items()
+                   if value != defaults[key].default)
+
+
 def main(benchmark: str, solver_timeout: int = 2000000, replace_basis: bool = False,
-         use_compatibility: bool = False) -> None:
+         use_compatibility: bool = False, learner_options: dict | None = None) -> None:
     if benchmark == "oliveira":
-        run_test_cases_pool("all", f"_t{solver_timeout}_r{replace_basis}_c{use_compatibility}", solver_timeout,
-                            replace_basis, use_compatibility)
+        run_test_cases_pool("all", f"_t{solver_timeout}_r{replace_basis}_c{use_compatibility}"
+                                   f"{options_extension(learner_options)}", solver_timeout,
+                            replace_basis, use_compatibility, learner_options)
+
+    elif benchmark == "sizes":
+        # The folders s04 to s23 hold the Oliveira benchmarks grouped by the size of the target DFA
+        for folder in [f"s{size:02d}" for size in range(4, 24)]:
+            run_test_cases_pool(folder, f"_t{solver_timeout}_r{replace_basis}_c{use_compatibility}"
+                                        f"{options_extension(learner_options)}", solver_timeout,
+                                replace_basis, use_compatibility, learner_options)
 
     elif benchmark == "mealy":
         models_folder = "benchmarking/models"
@@ -160,7 +185,8 @@ def main(benchmark: str, solver_timeout: int = 2000000, replace_basis: bool = Fa
                 output_alphabet.add(output)
         alphabet = list(set(input_alphabet + list(output_alphabet)))
         learned_mealy, info = run_lsharp_square(alphabet, sul, oracle, return_data=True, solver_timeout=solver_timeout,
-                                                replace_basis=replace_basis, use_compatibility=use_compatibility)
+                                                replace_basis=replace_basis, use_compatibility=use_compatibility,
+                                                **(learner_options or {}))
         dfa_oracle = PerfectKnowledgeEqOracle(alphabet, None, learned_mealy)
         missings = []
         for i in range(0, 51, 5):
@@ -172,12 +198,12 @@ def main(benchmark: str, solver_timeout: int = 2000000, replace_basis: bool = Fa
 
         logging.info(f"Running Mealy benchmarks on {len(file_paths)} files in {models_folder}")
         print(
-            "missing_transitions,learning_rounds,automaton_size,learning_time,smt_time,eq_oracle_time,total_time,queries_learning,successful_queries_learning,validity_query,nodes,informative_nodes,sul_steps,cache_saved,queries_eq_oracle,steps_eq_oracle,successful")
+            "missing_transitions,learning_rounds,automaton_size,learning_time,smt_time,smt_encode_time,eq_oracle_time,total_time,queries_learning,successful_queries_learning,validity_query,nodes,informative_nodes,sul_steps,cache_saved,queries_eq_oracle,steps_eq_oracle,successful")
         # run_mealy_benchmarks(file_paths[0], solver_timeout, replace_basis, use_compatibility)
         with concurrent.futures.ProcessPoolExecutor() as executor:
             executor.map(run_mealy_benchmarks, file_paths, [solver_timeout] * len(file_paths),
                          [replace_basis] * len(file_paths), [use_compatibility] * len(file_paths), missings,
-                         [dfa_oracle] * len(file_paths))
+                         [dfa_oracle] * len(file_paths), [learner_options] * len(file_paths))
         logging.info("Mealy benchmarks complete")
     else:
         logging.error(f"Unknown benchmark type: {benchmark}")
@@ -187,14 +213,59 @@ def main(benchmark: str, solver_timeout: int = 2000000, replace_basis: bool = Fa
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run benchmarks in run_benchmarks.py")
-    parser.add_argument("-b", "--benchmark", type=str, choices=["oliveira", "mealy"], required=True,
-                        help="Benchmark to run: \"oliveira\" or \"mealy\"")
+    parser.add_argument("-b", "--benchmark", type=str, choices=["oliveira", "sizes", "mealy"], required=True,
+                        help="Benchmark to run: \"oliveira\", \"sizes\" or \"mealy\"")
     parser.add_argument("-t", "--timeout", type=int, default=200, help="Solver timeout (integer, default: 200)")
     parser.add_argument("-r", "--replace-basis", action="store_true", dest="replace_basis",
                         help="Set replace_basis to True")
     parser.add_argument("-c", "--compatibility", action="store_true", dest="use_compatibility",
                         help="Set use_compatibility to True")
+    parser.add_argument("-i", "--incremental", action="store_true", dest="incremental",
+                        help="Keep one incremental SMT session for the whole run")
+    parser.add_argument("-e", "--encoding", type=str, choices=["smt", "sat", "z3"], default="smt",
+                        help="Encoding of the hypothesis search: \"smt\" (default), \"sat\" or \"z3\"")
+    parser.add_argument("-s", "--symmetry-breaking", action="store_true", dest="symmetry_breaking",
+                        help="Order the states outside the basis to break symmetries in the hypothesis search")
+    parser.add_argument("-u", "--reuse-hypothesis", action="store_true", dest="reuse_hypothesis",
+                        help="Reuse the previous hypothesis while it is consistent, and use it as solver hint")
+    parser.add_argument("-p", "--portfolio", type=int, default=0,
+                        help="Number of differently configured solver processes per hypothesis (default: 0, off)")
+    parser.add_argument("-z", "--size-search", type=str, choices=["linear", "bounded", "galloping"], default="linear",
+                        help="Search of the hypothesis size: \"linear\" (default), \"bounded\" or \"galloping\"")
+    parser.add_argument("-g", "--graph-coloring", action="store_true", dest="graph_coloring",
+                        help="Bound the size by a clique of apart nodes and try a greedy coloring before the solver")
+    parser.add_argument("-l", "--lazy-depth", type=int, default=None, dest="lazy_depth",
+                        help="Encode nodes up to this many levels below the basis and add deeper ones when needed")
+    parser.add_argument("-k", "--unsat-cores", action="store_true", dest="unsat_cores",
+                        help="Identify the frontier nodes in the unsat core of an UNSAT answer")
+    parser.add_argument("-n", "--numpy-apartness", action="store_true", dest="numpy_apartness",
+                        help="Check apartness on a numpy snapshot of the observation tree (needs numpy)")
+    parser.add_argument("-w", "--witness-ranking", action="store_true", dest="witness_ranking",
+                        help="Query the witnesses that rule out the most basis candidates per input symbol first")
+    parser.add_argument("-x", "--lazy-experiments", action="store_true", dest="lazy_experiments",
+                        help="With -c, stop the experiments of a conflict as soon as the nodes are apart")
+    parser.add_argument("-a", "--compact-tree", action="store_true", dest="compact_tree",
+                        help="Store the observation tree as arrays instead of node objects")
+    parser.add_argument("-d", "--hash-consing", action="store_true", dest="hash_consing",
+                        help="Check apartness on canonical ids of identical subtrees")
+    parser.add_argument("-q", "--prune-unknown", action="store_true", dest="prune_unknown",
+                        help="After every counterexample, prune the subtrees without known outputs")
+    parser.add_argument("-f", "--expansion", type=str, choices=["product", "prefix"], default="product",
+                        help="Expansion of the frontier: all words (\"product\", default) or by prefix (\"prefix\")")
+    parser.add_argument("-y", "--expansion-depth", type=int, default=3, dest="expansion_depth",
+                        help="Levels to expand beyond the size minus the basis size (integer, default: 3)")
+    parser.add_argument("-m", "--expansion-budget", type=int, default=None, dest="expansion_budget",
+                        help="Maximum number of queries of the frontier expansion per learning round")
     args = parser.parse_args()
 
+    options = {"incremental": args.incremental, "encoding": args.encoding,
+               "symmetry_breaking": args.symmetry_breaking, "reuse_hypothesis": args.reuse_hypothesis,
+               "portfolio": args.portfolio, "size_search": args.size_search,
+               "graph_coloring": args.graph_coloring, "lazy_depth": args.lazy_depth,
+               "unsat_cores": args.unsat_cores, "numpy_apartness": args.numpy_apartness,
+               "witness_ranking": args.witness_ranking, "lazy_experiments": args.lazy_experiments,
+               "compact_tree": args.compact_tree, "hash_consing": args.hash_consing,
+               "prune_unknown": args.prune_unknown, "expansion": args.expansion,
+               "expansion_depth": args.expansion_depth, "expansion_budget": args.expansion_budget}
     main(benchmark=args.benchmark, solver_timeout=args.timeout, replace_basis=args.replace_basis,
-         use_compatibility=args.use_compatibility)
+         use_compatibility=args.use_compatibility, learner_options=options)
@@ -0,0 +1,75 @@
+import itertools
+import random
+
+from Apartness import Apartness
+from ArrayTree import ArrayTree
+from MooreNode import MooreNode
+
+ALPHABET = ["a", "b"]
+
+
+def random_observations(seed, count=40, max_length=5):
+    rng = random.Random(seed)
+    observations = []
+    for _ in range(count):
+        word = [rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length))]
+        observations.append((word, rng.choice([True, False, None])))
+    return observations
+
+
+def insert(root, word, output):
+    node = root
+    for letter in word:
+        node = node.extend_and_get(letter, None)
+    node.set_output(output)
+    return node
+
+
+def nodes_of(root):
+    nodes, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.successors.values())
+    return nodes
+
+
+def check_against_apartness(root, array_tree):
+    nodes = nodes_of(root)
+    pairs = list(itertools.combinations(nodes, 2))
+    apart = array_tree.apart([first for first, _ in pairs], [second for _, second in pairs])
+    for (first, second), result in zip(pairs, apart):
+        assert result == (Apartness._show_states_are_apart_moore(first, second, ALPHABET) is not None)
+
+
+def test_apart_matches_apartness():
+    for seed in range(5):
+        root = MooreNode()
+        array_tree = ArrayTree(ALPHABET)
+        for word, output in random_observations(seed):
+            array_tree.mark_stale(insert(root, word, output))
+        check_against_apartness(root, array_tree)
+
+
+def test_stale_rows_are_updated():
+    root = MooreNode()
+    array_tree = ArrayTree(ALPHABET)
+    observations = random_observations(7, 200, 8)
+    for word, output in observations[:40]:
+        array_tree.mark_stale(insert(root, word, output))
+    check_against_apartness(root, array_tree)
+    # New outputs after a refresh, the arrays grow past their initial 64 rows
+    for word, output in observations[40:]:
+        array_tree.mark_stale(insert(root, word, output))
+    check_against_apartness(root, array_tree)
+
+
+def test_distinguishing_sequences_match_apartness():
+    for seed in range(5):
+        root = MooreNode()
+        array_tree = ArrayTree(ALPHABET)
+        for word, output in random_observations(seed):
+            array_tree.mark_stale(insert(root, word, output))
+        group = [node for node in nodes_of(root) if node.depth <= 1]
+        expected = list(Apartness._get_distinguishing_sequences_moore(group, ALPHABET))
+        assert list(array_tree.distinguishing_sequences(group)) == expected
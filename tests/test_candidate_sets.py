@@ -0,0 +1,78 @@
+from CandidateSets import CandidateSets
+
+
+def candidate_sets(basis, frontier):
+    candidate_sets = CandidateSets()
+    for basis_node in basis:
+        candidate_sets.add_basis(basis_node)
+    for node in frontier:
+        candidate_sets.add_node(node)
+    return candidate_sets
+
+
+def test_new_nodes_have_every_basis_node_as_candidate():
+    candidates = candidate_sets("abc", "xy")
+    assert candidates["x"] == {"a", "b", "c"}
+    assert candidates.count("y") == 3
+    assert candidates.get("z") is None
+    assert list(candidates) == ["x", "y"]
+    assert "x" in candidates and "a" not in candidates
+
+
+def test_exclude():
+    candidates = candidate_sets("abc", "xy")
+    candidates.exclude("x", ["a", "c"])
+    assert candidates["x"] == {"b"}
+    assert candidates["y"] == {"a", "b", "c"}
+    assert candidates.is_only_candidate("x", "b")
+    assert not candidates.is_only_candidate("y", "b")
+    assert candidates.only_candidate("x") == "b"
+    assert candidates.has_candidate("y", "a") and not candidates.has_candidate("x", "a")
+    # Excluding again changes nothing
+    candidates.exclude("x", ["a"])
+    assert candidates["x"] == {"b"}
+
+
+def test_add_and_remove_basis():
+    candidates = candidate_sets("ab", "xy")
+    candidates.exclude("x", ["a"])
+    candidates.add_basis("c")
+    assert candidates["x"] == {"b", "c"}
+    candidates.remove_basis("b")
+    assert candidates["x"] == {"c"}
+    assert candidates["y"] == {"a", "c"}
+    # Bits are not reused, the new basis node gets a bit of its own
+    candidates.add_basis("d")
+    assert candidates.bits == {"a": 0, "c": 2, "d": 3}
+    assert candidates["x"] == {"c", "d"}
+
+
+def test_masks_and_nodes_of():
+    candidates = candidate_sets("abc", "xy")
+    candidates.exclude("y", ["b"])
+    masks = dict(candidates.masks())
+    assert masks == {"x": 0b111, "y": 0b101}
+    assert candidates.nodes_of(masks["y"]) == ["a", "c"]
+    assert list(CandidateSets.bits_of(0b1010)) == [1, 3]
+    assert candidates.basis_mask_of(["a", "c"]) == 0b101
+    assert dict(candidates.items()) == {"x": {"a", "b", "c"}, "y": {"a", "c"}}
+
+
+def test_holders_follow_the_candidates():
+    candidates = candidate_sets("abc", "xyz")
+    candidates.exclude("x", ["a"])
+    candidates.exclude("y", ["a", "b"])
+    assert candidates.nodes_with_candidate_in(candidates.basis_mask_of(["a"])) == {"z"}
+    assert candidates.nodes_with_candidate_in(candidates.basis_mask_of(["a", "b"])) == {"x", "z"}
+    candidates.remove_node("z")
+    assert candidates.nodes_with_candidate_in(candidates.basis_mask_of(["a", "b"])) == {"x"}
+    candidates.add_basis("d")
+    assert candidates.nodes_with_candidate_in(candidates.basis_mask_of(["d"])) == {"x", "y"}
+    mask_of_b = candidates.basis_mask_of(["b"])
+    candidates.remove_basis("b")
+    assert candidates.nodes_with_candidate_in(mask_of_b) == set()
+
+    # Rebuilding the holders from the excluded bits gives the same sets
+    holders = [set(nodes) for nodes in candidates.holders]
+    candidates.index_holders()
+    assert candidates.holders == holders
@@ -0,0 +1,77 @@
+from CompactTree import CompactTree, CompactNode
+from MooreNode import MooreNode
+
+ALPHABET = ["a", "b", "c"]
+OBSERVATIONS = [(["b"], True), (["a", "c"], False), (["a"], None), (["c", "a", "b"], "unknown"), (["b", "b"], False),
+                (["a", "b"], True), ([], False), (["a", "c"], True)]
+
+
+def insert(root, word, output):
+    node = root
+    for letter in word:
+        node = node.extend_and_get(letter, None)
+    node.set_output(output)
+    return node
+
+
+def walk(root, word):
+    node = root
+    for letter in word:
+        node = node.get_successor(letter)
+    return node
+
+
+def build_trees():
+    moore_root = MooreNode()
+    compact_root = CompactTree(ALPHABET).root
+    for word, output in OBSERVATIONS:
+        insert(moore_root, word, output)
+        insert(compact_root, word, output)
+    return moore_root, compact_root
+
+
+def assert_same_tree(moore_node, compact_node):
+    assert compact_node.id == moore_node.id
+    assert compact_node.output == moore_node.output
+    assert compact_node.access_sequence == moore_node.access_sequence
+    assert compact_node.depth == moore_node.depth
+    assert compact_node.input_to_parent == moore_node.input_to_parent
+    assert compact_node.leads_to_known == moore_node.leads_to_known
+    assert compact_node.version == moore_node.version
+    moore_items = list(moore_node.successor_items())
+    compact_items = list(compact_node.successor_items())
+    assert [letter for letter, _ in compact_items] == [letter for letter, _ in moore_items]
+    for (_, moore_successor), (_, compact_successor) in zip(moore_items, compact_items):
+        assert compact_successor.parent == compact_node
+        assert_same_tree(moore_successor, compact_successor)
+
+
+def test_compact_tree_matches_moore_nodes():
+    moore_root, compact_root = build_trees()
+    assert_same_tree(moore_root, compact_root)
+    assert compact_root.id_counter == moore_root.id_counter
+    assert str(compact_root) == str(moore_root)
+
+
+def test_views_compare_by_node():
+    _, root = build_trees()
+    first = root.get_successor("a")
+    second = CompactNode(root.tree, first.id)
+    assert first == second and hash(first) == hash(second)
+    assert first != root.get_successor("b")
+    assert first != CompactTree(ALPHABET).root.extend_and_get("a", None)
+    assert root.get_successor("d") is None
+    assert root.parent is None
+
+
+def test_remove_successor():
+    moore_root, compact_root = build_trees()
+    for word, letter in [(["a"], "c"), ([], "b"), ([], "a")]:
+        walk(moore_root, word).remove_successor(letter)
+        walk(compact_root, word).remove_successor(letter)
+        assert_same_tree(moore_root, compact_root)
+    # A removed successor can be added again, as a new node after the remaining ones
+    insert(moore_root, ["a"], True)
+    insert(compact_root, ["a"], True)
+    assert_same_tree(moore_root, compact_root)
+    assert [letter for letter, _ in compact_root.successor_items()] == ["c", "a"]
@@ -0,0 +1,79 @@
+import itertools
+
+import pytest
+
+from HypothesisInstance import HypothesisInstance
+from IncompleteDfaSUL import IncompleteDfaSUL
+from LazyEncoder import LazyEncoder
+from ObservationTreeSquare import ObservationTreeSquare
+from SatEncoder import SatEncoder
+from SmtEncoder import SmtEncoder
+from Z3Encoder import Z3Encoder
+
+ENCODERS = [SmtEncoder, SatEncoder, Z3Encoder]
+
+
+def alternating_instance(size, candidates=(0,)):
+    """
+    A chain of 3 nodes over one letter with the outputs True, False, True and the root as basis. The middle node is a
+    frontier node, it needs a second state, so there is a hypothesis of size 2 but not of size 1.
+    """
+    return HypothesisInstance(size, 1, [-1, 0, 1], [-1, 0, 0], [True, False, True], [0], [(1, list(candidates))])
+
+
+def lazy(encoder):
+    def find_hypothesis(instance, solver_timeout, **options):
+        return LazyEncoder.find_hypothesis(instance, solver_timeout, encoder, 0, **options)
+    return find_hypothesis
+
+
+FIND_HYPOTHESIS = [encoder.find_hypothesis for encoder in ENCODERS] + [lazy(encoder) for encoder in ENCODERS]
+IDS = ["smt", "sat", "z3", "lazy-smt", "lazy-sat", "lazy-z3"]
+
+
+@pytest.mark.parametrize("find_hypothesis", FIND_HYPOTHESIS, ids=IDS)
+@pytest.mark.parametrize("symmetry_breaking", [False, True])
+def test_satisfiable_instance(find_hypothesis, symmetry_breaking):
+    instance = alternating_instance(2)
+    transition_mapping, output_mapping = find_hypothesis(instance, 10000, symmetry_breaking=symmetry_breaking)
+    assert transition_mapping == [[1], [0]]
+    assert output_mapping == [True, False]
+    assert instance.violations(transition_mapping, output_mapping) == []
+
+
+@pytest.mark.parametrize("find_hypothesis", FIND_HYPOTHESIS, ids=IDS)
+@pytest.mark.parametrize("candidates", [(0,), ()])
+def test_unsatisfiable_instance(find_hypothesis, candidates):
+    # Without candidates the frontier node has no state to map to at all
+    assert find_hypothesis(alternating_instance(1, candidates), 10000) == (None, None)
+
+
+def parity_tree(**options):
+    """
+    Observation tree of the words up to length 2 over a and b, accepted with an even number of a. The frontier is
+    expanded but no node is promoted, so the basis is the root alone and a hypothesis needs 2 states.
+    """
+    words = [(list(word), word.count("a") % 2 == 0)
+             for length in range(3) for word in map("".join, itertools.product("ab", repeat=length))]
+    ob_tree = ObservationTreeSquare(["a", "b"], IncompleteDfaSUL(words), 10, True, False, **options)
+    ob_tree.expand_frontier()
+    ob_tree.update_frontier_to_basis_dict()
+    return ob_tree
+
+
+@pytest.mark.parametrize("options", [{"encoding": "smt"}, {"encoding": "sat"}, {"encoding": "z3"},
+                                     {"incremental": True}, {"incremental": True, "symmetry_breaking": True},
+                                     {"lazy_depth": 0}, {"unsat_cores": True}],
+                         ids=["smt", "sat", "z3", "session", "session-symmetry", "lazy", "cores"])
+def test_encodings_of_the_tree_agree(options):
+    ob_tree = parity_tree(**options)
+    assert len(ob_tree.guaranteed_basis) == 1
+
+    # The session keeps its solver between the calls, the sizes go down again to retract the size guard
+    for size, satisfiable in [(1, False), (2, True), (1, False), (3, True)]:
+        ob_tree.size = size
+        transition_mapping, output_mapping = ob_tree.find_hypothesis()
+        assert ob_tree.last_answer == ("sat" if satisfiable else "unsat")
+        assert (transition_mapping is not None) == satisfiable
+        if satisfiable:
+            assert ob_tree.hypothesis_is_consistent(transition_mapping, output_mapping)
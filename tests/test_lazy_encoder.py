@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+from HypothesisInstance import HypothesisInstance
+from LazyEncoder import LazyEncoder
+from SatEncoder import SatEncoder
+from SmtEncoder import SmtEncoder
+from Z3Encoder import Z3Encoder
+
+
+def chain_instance():
+    """
+    A chain of 5 nodes over one letter, with the root as basis and no known outputs. Node 3 is deeper than lazy depth
+    0 encodes, and it is apart from node 1.
+    """
+    return HypothesisInstance(3, 1, [-1, 0, 1, 2, 3], [-1, 0, 0, 0, 0], [None] * 5, [0], [(1, [0])],
+                              apart_pairs=[(3, 1)])
+
+
+@pytest.mark.parametrize("encoder", [SmtEncoder, SatEncoder, Z3Encoder])
+def test_apart_pair_below_lazy_depth(encoder):
+    instance = chain_instance()
+    start_time = time.time()
+    transition_mapping, output_mapping = LazyEncoder.find_hypothesis(instance, 3000, encoder, 0)
+    assert transition_mapping is not None
+    assert instance.violations(transition_mapping, output_mapping) == []
+    assert time.time() - start_time < 2
+
+
+def test_violations_report_both_nodes_of_an_apart_pair():
+    instance = chain_instance()
+    # Every node maps to state 0
+    assert instance.violations([[0], [0], [0]], [False, False, False]) == [3, 1]
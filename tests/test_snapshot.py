@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from IncompleteDfaSUL import IncompleteDfaSUL
+from ObservationTreeSquare import ObservationTreeSquare
+from Snapshot import Snapshot
+from ValidityDataOracle import ValidityDataOracle
+
+ALPHABET = ["a", "b"]
+
+
+def sample():
+    """
+    60 random words up to length 8, accepted if the count of a is divisible by 3. The SUL answers the other words with
+    unknown, and the first hypothesis has a counterexample.
+    """
+    rng = random.Random(0)
+    words = [[rng.choice(ALPHABET) for _ in range(rng.randint(0, 8))] for _ in range(60)]
+    return [(word, word.count("a") % 3 == 0) for word in words]
+
+
+def learner(**options):
+    return ObservationTreeSquare(ALPHABET, IncompleteDfaSUL(sample()), 10, True, False, **options)
+
+
+def learning_round(ob_tree):
+    """
+    Build a hypothesis and process its counterexample, like run_lsharp_square. Returns whether learning goes on.
+    """
+    hypothesis = ob_tree.build_hypothesis()
+    if hypothesis is None:
+        return True
+    cex = ValidityDataOracle(sample()).find_cex(hypothesis)
+    if cex is None:
+        return False
+    hypothesis.reset_to_initial()
+    last = hypothesis.step(None)
+    for letter in cex:
+        last = hypothesis.step(letter)
+    ob_tree.process_counter_example(cex, not last)
+    return True
+
+
+def tree_rows(ob_tree):
+    rows, stack = [], [ob_tree.root]
+    while stack:
+        node = stack.pop()
+        rows.append((node.id, node.access_sequence, node.output, node.leads_to_known, node.version))
+        stack.extend(successor for _, successor in node.successor_items())
+    return sorted(rows)
+
+
+def state(ob_tree):
+    return (tree_rows(ob_tree), [node.id for node in ob_tree.guaranteed_basis],
+            {node.id: sorted(basis_node.id for basis_node in candidates)
+             for node, candidates in ob_tree.frontier_to_basis_dict.items()},
+            ob_tree.size, ob_tree.size_lower_bound, ob_tree.last_answer, ob_tree.sul.num_queries)
+
+
+def holder_ids(ob_tree):
+    return [{node.id for node in nodes} for nodes in ob_tree.frontier_to_basis_dict.holders]
+
+
+@pytest.mark.parametrize("options", [{}, {"compact_tree": True}, {"prune_unknown": True, "expansion": "prefix"}],
+                         ids=["moore", "compact", "pruned"])
+def test_round_trip(tmp_path, options):
+    ob_tree = learner(**options)
+    assert learning_round(ob_tree)
+    path = tmp_path / "learner.snap"
+    Snapshot.save(path, ob_tree, {"learning_rounds": 1})
+
+    resumed = learner(**options)
+    assert Snapshot.load(path, resumed) == {"learning_rounds": 1}
+    assert state(resumed) == state(ob_tree)
+    assert holder_ids(resumed) == holder_ids(ob_tree)
+    if options.get("prune_unknown"):
+        assert len(resumed.pruned_subtrees) == len(ob_tree.pruned_subtrees) > 0
+
+    # Both learners take the same steps to the end
+    while learning_round(ob_tree):
+        assert learning_round(resumed)
+    assert not learning_round(resumed)
+    assert state(resumed) == state(ob_tree)
+
+
+def test_load_checks_the_options(tmp_path):
+    ob_tree = learner()
+    learning_round(ob_tree)
+    path = tmp_path / "learner.snap"
+    Snapshot.save(path, ob_tree)
+    with pytest.raises(ValueError, match="other options: encoding"):
+        Snapshot.load(path, learner(encoding="z3"))
+    with pytest.raises(ValueError, match="new observation tree"):
+        Snapshot.load(path, ob_tree)